@@ -0,0 +1,126 @@
+import os
+import re
+import threading
+
+
+class Lexicon:
+    """
+    This class represents a collection of words or phrases, read from one of the files of this directory. When a text
+    is searched, the collection is compiled into a single alternation pattern, so that the text is matched against all
+    of its words and phrases at once.
+    """
+    def __init__(self, name: str, words: [str]):
+        self._name = name
+        self._words = tuple(words)
+        self._word_set = frozenset(self._words)
+        self._pattern = None
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'Lexicon {self._name}: [{len(self._words)} words]'
+
+    def __len__(self):
+        return len(self._words)
+
+    def __iter__(self):
+        return iter(self._words)
+
+    def __contains__(self, word: str):
+        return word in self._word_set
+
+    @property
+    def name(self):
+        """
+        :type: str
+        """
+        return self._name
+
+    @property
+    def words(self):
+        """
+        :type: (str)
+        """
+        return self._words
+
+    @property
+    def word_set(self):
+        """
+        :type: frozenset
+        """
+        return self._word_set
+
+    @property
+    def pattern(self):
+        """
+        :type: re.Pattern
+        """
+        if self._pattern is None:
+            # An empty alternation would match everywhere, an empty collection must match nowhere
+            alternation = '|'.join(re.escape(word) for word in self._words) if self._words else r'(?!)'
+            self._pattern = re.compile(rf'\b(?:{alternation})\b')
+        return self._pattern
+
+    def search(self, text: str):
+        """
+        Check if the text contains one of the words or phrases of the collection, as whole words.
+
+        :param text: The text
+        :return: True if the text contains one of the words or phrases, False otherwise
+        """
+        return self.pattern.search(text) is not None
+
+    def match(self, text: str):
+        """
+        Check if the text starts with one of the words or phrases of the collection, as whole words.
+
+        :param text: The text
+        :return: True if the text starts with one of the words or phrases, False otherwise
+        """
+        return self.pattern.match(text) is not None
+
+    @classmethod
+    def from_file(cls, name: str):
+        """
+        Read a collection of words or phrases from its file, one per line.
+
+        :param name: The name of the file
+        :return: The Lexicon of the collection
+        """
+        with open(os.path.join(os.path.dirname(__file__), name), 'r') as file:
+            return cls(name, [line.strip() for line in file.readlines()])
+
+
+_lexicons = {}
+_lexicons_lock = threading.Lock()
+
+
+def get_lexicon(name: str):
+    """
+    Get a collection of words or phrases. Each collection is read from its file only once per process, and is then
+    shared by all the features.
+
+    :param name: The name of the collection, i.e. of its file
+    :return: The Lexicon of the collection
+    """
+    try:
+        return _lexicons[name]
+    except KeyError:
+        with _lexicons_lock:
+            if name not in _lexicons:
+                _lexicons[name] = Lexicon.from_file(name)
+
+            return _lexicons[name]
+
+
+def reload_lexicons(*names: str):
+    """
+    Read again the given collections from their files, e.g. after the files have been changed. The collections that
+    have not been loaded yet are read the first time they are used.
+
+    :param names: The names of the collections to reload, all the loaded collections if none is given
+    """
+    with _lexicons_lock:
+        for name in names or list(_lexicons):
+            _lexicons[name] = Lexicon.from_file(name)
@@ -0,0 +1,68 @@
+import numpy
+
+from .forest import CompiledForest
+
+
+class Cascade:
+    """
+    This class represents a two-stage classifier of the pairs. A cheap logistic regression screens every pair, and
+    only the pairs whose screen probability falls within an uncertainty band are escalated to the random forest. Most
+    pairs are clearly unrelated, so the forest only scores a small fraction of them. The band is given at prediction
+    time, so that the trade-off between latency and quality can be tuned without training the classifiers again.
+    """
+    def __init__(self, screen, forest):
+        self._screen = screen
+        self._forest = forest
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'Cascade: [{self._screen}, {self._forest}]'
+
+    @property
+    def screen(self):
+        """
+        :type: LogisticRegression
+        """
+        return self._screen
+
+    @property
+    def forest(self):
+        """
+        :type: RandomForestClassifier | CompiledForest
+        """
+        return self._forest
+
+    @property
+    def classes_(self):
+        """
+        :type: numpy.ndarray
+        """
+        return self._forest.classes_
+
+    def predict_proba(self,
+                      feature_matrix: numpy.ndarray,
+                      lower_bound: float,
+                      upper_bound: float,
+                      packed_matrix: numpy.ndarray = None):
+        """
+        Compute the probabilities of each class of the rows of a feature matrix. The rows whose screen probability of
+        the last class is within the bounds, included, are scored by the forest instead.
+
+        :param feature_matrix: The feature matrix
+        :param lower_bound: The lower bound of the uncertainty band
+        :param upper_bound: The upper bound of the uncertainty band
+        :param packed_matrix: The rows packed into bits, which a CompiledForest evaluates instead of the rows
+        :return: The probabilities of each class of each row, and the mask of the rows escalated to the forest
+        """
+        probabilities = self._screen.predict_proba(feature_matrix)
+        escalated = (probabilities[:, -1] >= lower_bound) & (probabilities[:, -1] <= upper_bound)
+
+        if escalated.any():
+            if isinstance(self._forest, CompiledForest) and packed_matrix is not None:
+                probabilities[escalated] = self._forest.predict_packed_proba(packed_matrix[escalated])
+            else:
+                probabilities[escalated] = self._forest.predict_proba(feature_matrix[escalated])
+
+        return probabilities, escalated
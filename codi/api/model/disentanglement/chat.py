@@ -1,7 +1,8 @@
 import math
-import datetime
+import numpy
 
 from .feature import Feature
+from .message_table import MessageTable
 from ..input.message import Message
 
 
@@ -26,6 +27,26 @@ class Time(Chat):
     """
     This class represents a 'time' feature.
     """
+    @classmethod
+    def get_size(cls, hyper_params):
+        """
+        The 'time' feature has one value for each bin.
+        """
+        return int(hyper_params['chat bins'])
+
+    @staticmethod
+    def _get_bin(diff: int, bin_size: int):
+        """
+        Bin logarithmically a time difference.
+
+        :param diff: The time difference in seconds
+        :param bin_size: The number of bins
+        :return: The index of the bin (-1, i.e. the last bin, for a difference of 0 seconds)
+        """
+        binning = int(math.log(diff + 1, 1.5))-1
+
+        return binning if binning < bin_size else bin_size - 1
+
     @classmethod
     def extract(cls, message1: Message, message2: Message, bin_size: int = 50):
         """
@@ -38,20 +59,10 @@ class Time(Chat):
         """
         one_hot = [0] * bin_size
 
-        message1_timestamp = message1.timestamp
-        message2_timestamp = message2.timestamp
-
-        if isinstance(message1_timestamp, datetime.datetime):
-            diff = abs(int(message2_timestamp.timestamp()) - int(message1_timestamp.timestamp()))
-        else:
-            diff = abs(int(message2_timestamp) - int(message1_timestamp))
+        diff = abs(MessageTable.get_timestamp(message2) - MessageTable.get_timestamp(message1))
 
         # Bin the time differences
-        binning = int(math.log(diff + 1, 1.5))-1
-        if binning < bin_size:
-            one_hot[binning] = 1
-        else:
-            one_hot[bin_size - 1] = 1
+        one_hot[cls._get_bin(diff, bin_size)] = 1
 
         time_obj = cls()
         time_obj.val = one_hot
@@ -60,6 +71,19 @@ class Time(Chat):
 
         return time_obj
 
+    @classmethod
+    def extract_batch(cls, table, left, right, out, hyper_params, unigram_probabilities):
+        """
+        Extract the 'time' feature of all the given pairs, binning each distinct time difference only once.
+        """
+        bin_size = int(hyper_params['chat bins'])
+        timestamps = table.timestamps
+
+        diffs, inverse = numpy.unique(numpy.abs(timestamps[left] - timestamps[right]), return_inverse=True)
+        bins = numpy.array([cls._get_bin(diff, bin_size) for diff in diffs.tolist()], dtype=numpy.int64)
+
+        out[numpy.arange(len(left)), bins[inverse.reshape(-1)]] = 1
+
 
 class Speaker(Chat):
     """
@@ -82,8 +106,31 @@ class Speaker(Chat):
 
         return speaker_obj
 
+    @classmethod
+    def extract_batch(cls, table, left, right, out, hyper_params, unigram_probabilities):
+        """
+        Extract the 'speaker' feature of all the given pairs by comparing the authors as integer ids.
+        """
+        author_ids = table.author_ids
+
+        out[:, 0] = author_ids[left] == author_ids[right]
+
 
 class HasMention(Chat):
+    _size = 2
+    _unary = True
+
+    @classmethod
+    def extract_message(cls, message: Message, hyper_params=None):
+        """
+        This method checks if the message has mentions.
+
+        :param message: The message
+        :param hyper_params: The hyperparameters' dictionary
+        :return: [1] if the message has mentions, [0] otherwise
+        """
+        return [1 if len(set(message.get_member_mentions())) > 0 else 0]
+
     @classmethod
     def extract(cls, message1: Message, message2: Message):
         """
@@ -93,14 +140,7 @@ class HasMention(Chat):
         :param message2: The second message
         :return: one hot encoding of the above conditions
         """
-        one_hot = [0, 0]
-        message1_member_mentions = set(message1.get_member_mentions())
-        message2_member_mentions = set(message2.get_member_mentions())
-
-        if len(message1_member_mentions) > 0:
-            one_hot[0] = 1
-        if len(message2_member_mentions) > 0:
-            one_hot[1] = 1
+        one_hot = cls.extract_message(message1) + cls.extract_message(message2)
 
         mention_obj = cls()
         mention_obj.val = one_hot
@@ -113,6 +153,8 @@ class CrossAuthorMention(Chat):
     """
     This class represents a 'mention' of the author of one message in the other and vice-versa.
     """
+    _size = 2
+
     @classmethod
     def extract(cls, message1: Message, message2: Message):
         """
@@ -142,6 +184,17 @@ class CrossAuthorMention(Chat):
 
         return mention_obj
 
+    @classmethod
+    def extract_batch(cls, table, left, right, out, hyper_params, unigram_probabilities):
+        """
+        Extract the cross author mentions of all the given pairs, from the mentions of the MessageTable.
+        """
+        authors, mentions = table.author_uuids, table.mentions
+
+        for k, (i, j) in enumerate(zip(left.tolist(), right.tolist())):
+            out[k, 0] = authors[j] in mentions[i]
+            out[k, 1] = authors[i] in mentions[j]
+
 
 class MentionSame(Chat):
     """
@@ -166,6 +219,16 @@ class MentionSame(Chat):
 
         return mention_obj
 
+    @classmethod
+    def extract_batch(cls, table, left, right, out, hyper_params, unigram_probabilities):
+        """
+        Extract the 'same mention' feature of all the given pairs, from the mentions of the MessageTable.
+        """
+        mentions = table.mentions
+
+        for k, (i, j) in enumerate(zip(left.tolist(), right.tolist())):
+            out[k, 0] = not mentions[i].isdisjoint(mentions[j])
+
 
 class MentionOther(Chat):
     """
@@ -191,3 +254,17 @@ class MentionOther(Chat):
         mention_obj.message_1, mention_obj.message_2 = message1, message2
 
         return mention_obj
+
+    @classmethod
+    def extract_batch(cls, table, left, right, out, hyper_params, unigram_probabilities):
+        """
+        Extract the 'different mention' feature of all the given pairs, from the mentions of the
+        MessageTable.
+        """
+        authors, mentions = table.author_uuids, table.mentions
+
+        for k, (i, j) in enumerate(zip(left.tolist(), right.tolist())):
+            intersection = mentions[i] & mentions[j]
+
+            if intersection:
+                out[k, 0] = len(intersection - {authors[i], authors[j]}) > 0
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import tqdm
+import numpy
+
+from typing import TYPE_CHECKING
+from collections import OrderedDict
+
+if TYPE_CHECKING:
+    from .pair_set import PairSet
+
+
+class Clustering:
+    """
+    This class represents the greedy clustering of the time sorted messages of a channel into conversations. Each
+    message joins the conversation with the highest sum of the weights of its pairs, if positive, otherwise it starts a
+    new conversation. The conversation of each message is indexed, so that only the conversations of the messages
+    paired with the current message are scored, since the other conversations have a zero sum.
+
+    Since the messages are only paired with the messages of a bounded window, a conversation whose last message is
+    older than the earliest message paired with the current message can no longer be joined. Such conversations are
+    moved from the active conversations to the closed ones, so that the active working set is bounded by the window.
+    """
+    def __init__(self):
+        self._labels = []
+        self._labels_offset = 0
+        self._conversations_n = 0
+        self._active_conversations = OrderedDict()
+        self._closed_conversations = {}
+
+    def __len__(self):
+        return self._labels_offset + len(self._labels)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'Clustering: [{len(self)} messages, {self._conversations_n} conversations]'
+
+    @property
+    def conversations(self):
+        """
+        :type: [[int]]
+        """
+        conversations = {**self._closed_conversations, **self._active_conversations}
+
+        return [conversations[conversation] for conversation in sorted(conversations)]
+
+    @property
+    def active_conversations(self):
+        """
+        :type: OrderedDict
+        """
+        return self._active_conversations
+
+    @property
+    def closed_conversations(self):
+        """
+        :type: {int: [int]}
+        """
+        return self._closed_conversations
+
+    @property
+    def labels(self):
+        """
+        :type: [int]
+        """
+        return self._labels
+
+    @property
+    def labels_offset(self):
+        """
+        :type: int
+        """
+        return self._labels_offset
+
+    @staticmethod
+    def _compute_weight(probability: float):
+        """
+        Given a probability, compute the weight of the pair.
+
+        :param probability: The probability of the pair of messages
+        """
+        # return numpy.log(probability / (1 - probability))
+        return probability - .5
+
+    def _retire_conversations(self, horizon: int):
+        """
+        Close the active conversations whose last message is older than the horizon. The active conversations are
+        ordered by their last message, so the search stops at the first conversation that is still active.
+
+        :param horizon: The index of the earliest message that can still be paired with the next messages
+        """
+        while self._active_conversations:
+            conversation, messages = next(iter(self._active_conversations.items()))
+
+            if messages[-1] >= horizon:
+                break
+
+            self._closed_conversations[conversation] = self._active_conversations.pop(conversation)
+
+    def _set_labels(self, labels: [int]):
+        """
+        Set the conversation of each message at once, e.g. when computed by another clustering algorithm.
+
+        :param labels: The index of the conversation of each message, numbered in the order of their first message
+        """
+        self._labels = labels
+        self._labels_offset = 0
+        self._conversations_n = max(labels) + 1 if labels else 0
+        self._active_conversations = OrderedDict((conversation, []) for conversation in range(self._conversations_n))
+        self._closed_conversations = {}
+
+        for message, conversation in enumerate(labels):
+            self._active_conversations[conversation].append(message)
+
+        self._active_conversations = OrderedDict(sorted(self._active_conversations.items(),
+                                                        key=lambda conversation: conversation[1][-1]))
+
+    def pop_closed_conversations(self):
+        """
+        Get the closed conversations, and forget them.
+
+        :return: The dictionary of the messages of each closed conversation
+        """
+        closed_conversations, self._closed_conversations = self._closed_conversations, {}
+
+        return closed_conversations
+
+    def forget_labels(self, horizon: int):
+        """
+        Forget the conversations of the messages older than the horizon, which can no longer be paired with the next
+        messages. The labels then start from the conversation of the message at index `labels_offset`.
+
+        :param horizon: The index of the earliest message that can still be paired with the next messages
+        """
+        if horizon > self._labels_offset:
+            del self._labels[:horizon - self._labels_offset]
+            self._labels_offset = horizon
+
+    def add_message(self, antecedents: [int], probabilities: [float], horizon: int = None):
+        """
+        Add the next message to the conversation with the highest quality, i.e. the highest sum of the weights of the
+        pairs of the message with the messages of the conversation. If no quality is positive, the message starts a new
+        conversation. Ties are broken in favour of the conversation started first.
+
+        :param antecedents: The indices of the earlier messages paired with the message, in ascending order
+        :param probabilities: The probabilities of the pairs
+        :param horizon: The index of the earliest message that can still be paired with the message and the next ones,
+                        by default its earliest paired message, since all the messages after it are paired as well
+        :return: The index of the conversation of the message
+        """
+        message = len(self)
+
+        if horizon is None:
+            horizon = antecedents[0] if len(antecedents) else message
+
+        self._retire_conversations(horizon)
+
+        qualities = {}
+
+        # The weights of each conversation are summed in the order of its messages
+        for antecedent, probability in zip(antecedents, probabilities):
+            conversation = self._labels[antecedent - self._labels_offset]
+            qualities[conversation] = qualities.get(conversation, 0.0) + self._compute_weight(probability)
+
+        best_conversation, best_quality = None, 0.0
+
+        for conversation in sorted(qualities):
+            if qualities[conversation] > best_quality:
+                best_conversation, best_quality = conversation, qualities[conversation]
+
+        if best_conversation is None:
+            best_conversation = self._conversations_n
+            self._conversations_n += 1
+            self._active_conversations[best_conversation] = []
+
+        self._active_conversations[best_conversation].append(message)
+        self._active_conversations.move_to_end(best_conversation)
+        self._labels.append(best_conversation)
+
+        return best_conversation
+
+    def cluster(self, pairs: PairSet, messages_n: int):
+        """
+        Cluster the messages of a channel, given all their pairs.
+
+        :param pairs: The PairSet of the pairs and their probabilities, sorted by their left message
+        :param messages_n: The number of messages of the channel
+        :return: The index of the conversation of each message
+        """
+        offsets = pairs.get_offsets(messages_n).tolist()
+        right = pairs.right.tolist()
+        probabilities = pairs.probabilities.tolist()
+
+        for message in tqdm.tqdm(range(messages_n), desc='Clustering messages'):
+            start, stop = offsets[message], offsets[message + 1]
+            self.add_message(right[start:stop], probabilities[start:stop])
+
+        return self._labels
+
+
+class VectorizedClustering(Clustering):
+    """
+    This class represents the same greedy clustering, computed on the arrays of the pairs. The qualities of the
+    candidate conversations of each message are accumulated with a single bincount over the conversations of its
+    paired messages, which sums the weights in the same order as the reference implementation, so that the
+    conversations are exactly the same.
+    """
+    def cluster(self, pairs: PairSet, messages_n: int):
+        """
+        Cluster the messages of a channel, given all their pairs.
+
+        :param pairs: The PairSet of the pairs and their probabilities, sorted by their left message
+        :param messages_n: The number of messages of the channel
+        :return: The index of the conversation of each message
+        """
+        offsets = pairs.get_offsets(messages_n).tolist()
+        right = pairs.right
+        weights = pairs.probabilities.astype(numpy.float64) - .5
+        labels = numpy.empty(messages_n, dtype=numpy.int64)
+        conversations_n = 0
+
+        for message in tqdm.tqdm(range(messages_n), desc='Clustering messages'):
+            start, stop = offsets[message], offsets[message + 1]
+            best_conversation = -1
+
+            if stop > start:
+                # The candidates are sorted, so that the first maximum is the conversation started first
+                candidates, inverse = numpy.unique(labels[right[start:stop]], return_inverse=True)
+                qualities = numpy.bincount(inverse.reshape(-1), weights=weights[start:stop])
+                best = qualities.argmax()
+
+                if qualities[best] > 0:
+                    best_conversation = candidates[best]
+
+            if best_conversation < 0:
+                best_conversation = conversations_n
+                conversations_n += 1
+
+            labels[message] = best_conversation
+
+        self._set_labels(labels.tolist())
+
+        return self._labels
+
+
+class UnionFindClustering(Clustering):
+    """
+    This class represents a faster, approximate clustering. Every pair whose probability is greater than the threshold
+    links its two messages, and the conversations are the connected components of the links, found with a
+    disjoint-set forest with path compression and union by rank. Since linking every pair of a busy window would chain
+    most of its messages together, by default each message is only linked through its most probable pair.
+    """
+    def __init__(self, threshold: float = .95, best_link: bool = True):
+        super().__init__()
+        self._threshold = threshold
+        self._best_link = best_link
+
+    @property
+    def threshold(self):
+        """
+        :type: float
+        """
+        return self._threshold
+
+    @property
+    def best_link(self):
+        """
+        :type: bool
+        """
+        return self._best_link
+
+    @staticmethod
+    def _get_best_links(pairs: PairSet):
+        """
+        Get the most probable pair of each message, the pair with the earliest message in case of ties.
+
+        :param pairs: The PairSet of the pairs and their probabilities, sorted by their left message
+        :return: The array of the indices of the pairs
+        """
+        if not len(pairs):
+            return numpy.arange(0)
+
+        # The pairs of each message are contiguous, starting where the left message changes
+        left = pairs.left
+        starts = numpy.flatnonzero(numpy.concatenate(([True], left[1:] != left[:-1])))
+        maxima = numpy.repeat(numpy.maximum.reduceat(pairs.probabilities, starts), numpy.diff(starts, append=len(left)))
+        candidates = numpy.flatnonzero(pairs.probabilities == maxima)
+        candidates_left = left[candidates]
+
+        return candidates[numpy.concatenate(([True], candidates_left[1:] != candidates_left[:-1]))]
+
+    @staticmethod
+    def _find(parents: [int], message: int):
+        """
+        Find the root of the tree of a message, pointing all the messages on the path directly to the root.
+
+        :param parents: The parent of each message
+        :param message: The index of the message
+        :return: The index of the root
+        """
+        root = message
+
+        while parents[root] != root:
+            root = parents[root]
+
+        while parents[message] != root:
+            parents[message], message = root, parents[message]
+
+        return root
+
+    def cluster(self, pairs: PairSet, messages_n: int):
+        """
+        Cluster the messages of a channel, given all their pairs.
+
+        :param pairs: The PairSet of the pairs and their probabilities, sorted by their left message
+        :param messages_n: The number of messages of the channel
+        :return: The index of the conversation of each message
+        """
+        parents = list(range(messages_n))
+        ranks = [0] * messages_n
+        links = self._get_best_links(pairs) if self._best_link else numpy.arange(len(pairs))
+        links = links[pairs.probabilities[links] > self._threshold]
+
+        for message1, message2 in zip(pairs.left[links].tolist(), pairs.right[links].tolist()):
+            root1, root2 = self._find(parents, message1), self._find(parents, message2)
+
+            if root1 == root2:
+                continue
+
+            if ranks[root1] < ranks[root2]:
+                root1, root2 = root2, root1
+
+            parents[root2] = root1
+
+            if ranks[root1] == ranks[root2]:
+                ranks[root1] += 1
+
+        # The conversations are numbered in the order of their first message, as in the greedy clustering
+        conversations = {}
+        self._set_labels([conversations.setdefault(self._find(parents, message), len(conversations))
+                          for message in range(messages_n)])
+
+        return self._labels
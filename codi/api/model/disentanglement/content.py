@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 import re
-import math
+import numpy
 
-from decimal import Decimal
 from typing import TYPE_CHECKING
 
 from .feature import Feature
+from .vocabulary import Vocabulary
+from ...collections import get_lexicon
 
 if TYPE_CHECKING:
     from ..input.message import Message
@@ -33,8 +34,20 @@ class Repeat(Content):
     """
     This class represents the 'repeat' feature.
     """
+    _size = 5
+
     @staticmethod
-    def _get_common_words(message1: Message, message2: Message, unigram_probabilities: {str: float}):
+    def _get_words(message: Message):
+        """
+        Get the set of words of the message, without the removed blocks (e.g. __MENTION__).
+
+        :param message: The message
+        :return: The set of words of the message
+        """
+        return Vocabulary.get_words(message.processable_text)
+
+    @classmethod
+    def _get_common_words(cls, message1: Message, message2: Message, unigram_probabilities: {str: float}):
         """
         Find which words are in common between the two messages.
 
@@ -42,13 +55,17 @@ class Repeat(Content):
         :param message2: The second message
         :return: The list of words in common between the two messages
         """
-        message1_text = re.sub(r'_{2}([A-Z]*_?)*_{2}|_|\?', ' ', message1.processable_text).lower()
-        message2_text = re.sub(r'_{2}([A-Z]*_?)*_{2}|_|\?', ' ', message2.processable_text).lower()
+        return list(cls._get_words(message1) & cls._get_words(message2) & unigram_probabilities.keys())
 
-        message1_words = set([word for word in message1_text.split() if word not in ['', ' ']])
-        message2_words = set([word for word in message2_text.split() if word not in ['', ' ']])
+    @classmethod
+    def _get_bin(cls, probability: float):
+        """
+        Bin logarithmically the probability of a word.
 
-        return list(message1_words & message2_words & unigram_probabilities.keys())
+        :param probability: The unigram probability of the word
+        :return: The index of the bin
+        """
+        return Vocabulary.get_bin(probability, cls._size)
 
     @classmethod
     def extract(cls, message1: Message, message2: Message, unigram_probabilities: {str: float}):
@@ -61,19 +78,12 @@ class Repeat(Content):
         :param unigram_probabilities: The unigram probabilities
         :return: The one-hot vector of the repeated words
         """
-        bin_size = 5
-        one_hot = [0] * bin_size
+        one_hot = [0] * cls._size
         common_words = cls()._get_common_words(message1, message2, unigram_probabilities)
 
         # Bin the common words
         for word in common_words:
-            word_dec = Decimal(unigram_probabilities[word])
-
-            if word_dec > 0:
-                binning = -int(math.log(word_dec, 10))
-                one_hot[binning] += 1
-            else:
-                one_hot[0] += 1
+            one_hot[cls._get_bin(unigram_probabilities[word])] += 1
 
         repeat_obj = cls()
         repeat_obj.val = one_hot
@@ -82,11 +92,57 @@ class Repeat(Content):
 
         return repeat_obj
 
+    @classmethod
+    def extract_batch(cls, table, left, right, out, hyper_params, unigram_probabilities):
+        """
+        Extract the 'repeat' feature of all the given pairs. The words of each message are turned into sorted
+        vocabulary ids only once, and the words of the left message of each pair are looked up among the (message,
+        word) keys of all the messages, so that the common words of all the pairs are found at once.
+        """
+        vocabulary = unigram_probabilities if isinstance(unigram_probabilities, Vocabulary) \
+            else Vocabulary.from_probabilities(unigram_probabilities)
+        offsets, word_ids = table.get_word_ids(vocabulary)
+        bins = vocabulary.get_bins(cls._size)
+
+        if not len(word_ids) or not len(left):
+            return
+
+        # The (message, word) keys are sorted, since the messages are in order and their ids are sorted
+        words_n = len(vocabulary)
+        keys = numpy.repeat(numpy.arange(len(table), dtype=numpy.int64), numpy.diff(offsets)) * words_n + word_ids
+
+        # Gather the words of the left message of each pair
+        counts = offsets[left + 1] - offsets[left]
+        pair_index = numpy.repeat(numpy.arange(len(left)), counts)
+        starts = numpy.repeat(offsets[left] - (numpy.cumsum(counts) - counts), counts)
+        words = word_ids[starts + numpy.arange(len(pair_index))]
+
+        # Keep the ones that are words of the right message as well
+        queries = right[pair_index].astype(numpy.int64) * words_n + words
+        found = keys[numpy.minimum(numpy.searchsorted(keys, queries), len(keys) - 1)] == queries
+
+        out[pair_index[found], bins[words[found]]] = 1
+
 
 class Tech(Content):
     """
     This class represents the 'tech' feature.
     """
+    _size = 3
+
+    @staticmethod
+    def _has_tech(message: Message, tech_words: {str}):
+        """
+        Check if the message contains technical jargon or an IP address.
+
+        :param message: The message
+        :param tech_words: The set of technical words
+        :return: 1 if the message contains technical jargon, 0 otherwise
+        """
+        ip_regex = re.compile(r'\b((?:[0-9]{1,3}\.){3}[0-9]{1,3})\b')
+
+        return 1 if set(message.words) & tech_words or ip_regex.search(message.text) else 0
+
     @classmethod
     def extract(cls, message1: Message, message2: Message):
         """
@@ -99,16 +155,10 @@ class Tech(Content):
         """
         # message1 has tech, message2 has tech, neither has tech
         one_hot = [0, 0, 0]
-        ip_regex = re.compile(r'\b((?:[0-9]{1,3}\.){3}[0-9]{1,3})\b')
-        tech_words = set(cls._get_collection_from_file('tech_words'))
-        words_message_1 = set(message1.words)
-        words_message_2 = set(message2.words)
+        tech_words = get_lexicon('tech_words').word_set
 
-        if words_message_1 & tech_words or ip_regex.search(message1.text):
-            one_hot[0] = 1
-
-        if words_message_2 & tech_words or ip_regex.search(message2.text):
-            one_hot[1] = 1
+        one_hot[0] = cls._has_tech(message1, tech_words)
+        one_hot[1] = cls._has_tech(message2, tech_words)
 
         if one_hot[0] == one_hot[1] == 0:
             one_hot[2] = 1
@@ -120,11 +170,46 @@ class Tech(Content):
 
         return tech_obj
 
+    @classmethod
+    def extract_messages_batch(cls, messages: [Message], hyper_params):
+        """
+        Check if each message contains technical jargon.
+        """
+        tech_words = get_lexicon('tech_words').word_set
+
+        return numpy.array([cls._has_tech(message, tech_words) for message in messages],
+                           dtype=numpy.uint8).reshape(len(messages), 1)
+
+    @classmethod
+    def extract_batch(cls, table, left, right, out, hyper_params, unigram_probabilities):
+        """
+        Extract the 'tech' feature of all the given pairs from the values of the MessageTable.
+        """
+        has_tech = table.get_values(cls)[:, 0]
+
+        out[:, 0] = has_tech[left]
+        out[:, 1] = has_tech[right]
+        out[:, 2] = (out[:, 0] == 0) & (out[:, 1] == 0)
+
 
 class ContainsCode(Content):
     """
     This class represents a 'contains_code' feature.
     """
+    _size = 2
+    _unary = True
+
+    @classmethod
+    def extract_message(cls, message: Message, hyper_params=None):
+        """
+        This method checks if the message contains a code block.
+
+        :param message: The message
+        :param hyper_params: The hyperparameters' dictionary
+        :return: [1] if the message contains a code block, [0] otherwise
+        """
+        return [1 if message.has_code_blocks() else 0]
+
     @classmethod
     def extract(cls, message1: Message, message2: Message):
         """
@@ -136,9 +221,7 @@ class ContainsCode(Content):
                                                         0 otherwise
                                    Same thing goes of the second message -- with the second message.
         """
-        one_hot = [0, 0]
-        one_hot[0] = 1 if message1.has_code_blocks() else 0
-        one_hot[1] = 1 if message2.has_code_blocks() else 0
+        one_hot = cls.extract_message(message1) + cls.extract_message(message2)
 
         long_obj = cls()
         long_obj.val = one_hot
@@ -151,6 +234,20 @@ class ContainsLink(Content):
     """
     This class represents a 'contains_link' feature.
     """
+    _size = 2
+    _unary = True
+
+    @classmethod
+    def extract_message(cls, message: Message, hyper_params=None):
+        """
+        This method checks if the message contains a link (URL).
+
+        :param message: The message
+        :param hyper_params: The hyperparameters' dictionary
+        :return: [1] if the message contains a link (URL), [0] otherwise
+        """
+        return [1 if message.has_links() else 0]
+
     @classmethod
     def extract(cls, message1: Message, message2: Message):
         """
@@ -162,9 +259,7 @@ class ContainsLink(Content):
                                                         0 otherwise
                                    Same thing goes of the second message -- with the second message.
         """
-        one_hot = [0, 0]
-        one_hot[0] = 1 if message1.has_links() else 0
-        one_hot[1] = 1 if message2.has_links() else 0
+        one_hot = cls.extract_message(message1) + cls.extract_message(message2)
 
         long_obj = cls()
         long_obj.val = one_hot
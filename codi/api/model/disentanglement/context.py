@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .vocabulary import Vocabulary
+    from .probability_memo import ProbabilityMemo
+    from ..input.community import Community
+
+
+class Context:
+    """
+    This class represents the state of a single training, validation, or prediction request: the training set it uses,
+    the vocabulary and the classifier it has chosen, and the conversations it is computing. The Model only holds what
+    is shared by all the requests, so that several requests can run at the same time on the same Model.
+    """
+    def __init__(self, training_set: Community = None, training_set_hash: str = None):
+        self._training_set = training_set
+        self._training_set_hash = training_set_hash
+        self._vocabulary = None
+        self._classifier = None
+        self._probability_memo = None
+        self._gold_conversations = []
+        self._pred_conversations = []
+        self._statistics = {}
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'Context: [training set {self._training_set_hash}]'
+
+    @property
+    def training_set(self):
+        """
+        :type: Community
+        """
+        return self._training_set
+
+    @property
+    def training_set_hash(self):
+        """
+        :type: str
+        """
+        return self._training_set_hash
+
+    @property
+    def vocabulary(self):
+        """
+        :type: Vocabulary
+        """
+        return self._vocabulary
+
+    @property
+    def classifier(self):
+        """
+        :type: Any
+        """
+        return self._classifier
+
+    @property
+    def probability_memo(self):
+        """
+        :type: ProbabilityMemo
+        """
+        return self._probability_memo
+
+    @property
+    def gold_conversations(self):
+        """
+        :type: [int]
+        """
+        return self._gold_conversations
+
+    @property
+    def pred_conversations(self):
+        """
+        :type: [int]
+        """
+        return self._pred_conversations
+
+    @property
+    def statistics(self):
+        """
+        :type: dict
+        """
+        return self._statistics
+
+    @vocabulary.setter
+    def vocabulary(self, vocabulary: Vocabulary):
+        """
+        Set the vocabulary used to compute the features of the request.
+
+        :param vocabulary: The vocabulary
+        """
+        self._vocabulary = vocabulary
+
+    @classifier.setter
+    def classifier(self, classifier):
+        """
+        Set the trained classifier used to score the pairs of the request.
+
+        :param classifier: The trained classifier
+        """
+        self._classifier = classifier
+
+    @probability_memo.setter
+    def probability_memo(self, probability_memo: ProbabilityMemo):
+        """
+        Set the memo of the predictions of the classifier of the request.
+
+        :param probability_memo: The memo of the predictions, None to always use the classifier
+        """
+        self._probability_memo = probability_memo
+
+    @gold_conversations.setter
+    def gold_conversations(self, gold_conversations: [int]):
+        """
+        Set the target conversation of each message of the channel being validated.
+
+        :param gold_conversations: The target conversation labels
+        """
+        self._gold_conversations = gold_conversations
+
+    @pred_conversations.setter
+    def pred_conversations(self, pred_conversations: [int]):
+        """
+        Set the predicted conversation of each message of the channel being disentangled.
+
+        :param pred_conversations: The predicted conversation labels
+        """
+        self._pred_conversations = pred_conversations
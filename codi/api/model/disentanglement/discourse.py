@@ -1,6 +1,5 @@
-import re
-
 from .feature import Feature
+from ...collections import get_lexicon
 from ..input.message import Message
 
 
@@ -25,26 +24,23 @@ class CueWords(Discourse):
     """
     This class represents a 'cue words' feature.
     """
-    def __init__(self):
-        super().__init__()
-        self._thanks_answer = self._get_collection_from_file('cue_words_thanks_answer')
-        self._thanks = self._get_collection_from_file('cue_words_thanks')
-        self._answer = self._get_collection_from_file('cue_words_answer')
-
-        self._sub_features = [self._answer, self._thanks, self._thanks_answer]
-
-    @staticmethod
-    def _get_sub_features(sub_feature: [str], message1: str, message2: str):
-        one_hot = [0, 0]
+    # The collections of cue words of each sub feature
+    _sub_features = ['cue_words_answer', 'cue_words_thanks', 'cue_words_thanks_answer']
+    _size = 2 * len(_sub_features)
+    _unary = True
 
-        for cue_word in sub_feature:
-            if re.search(rf'\b{cue_word}\b', message1.strip().lower()):
-                one_hot[0] = 1
+    @classmethod
+    def extract_message(cls, message: Message, hyper_params=None):
+        """
+        This method checks if the message has a cue word of each sub feature in it.
 
-            if re.search(rf'\b{cue_word}\b', message2.strip().lower()):
-                one_hot[1] = 1
+        :param message: The message
+        :param hyper_params: The hyperparameters' dictionary
+        :return: The list of the values of the sub features
+        """
+        text = message.processable_text.strip().lower()
 
-        return one_hot
+        return [1 if get_lexicon(sub_feature).search(text) else 0 for sub_feature in cls._sub_features]
 
     @classmethod
     def extract(cls, message1: Message, message2: Message):
@@ -58,13 +54,11 @@ class CueWords(Discourse):
                                    Same thing goes of the second message -- with the second message.
         """
         one_hot = []
-        message1_text, message2_text = message1.processable_text, message2.processable_text
-
-        cue_words_obj = cls()
 
-        for sub_feature in cue_words_obj._sub_features:
-            one_hot.extend(cue_words_obj._get_sub_features(sub_feature, message1_text, message2_text))
+        for value1, value2 in zip(cls.extract_message(message1), cls.extract_message(message2)):
+            one_hot.extend([value1, value2])
 
+        cue_words_obj = cls()
         cue_words_obj.val = one_hot
         cue_words_obj.message_1, cue_words_obj.message_2 = message1, message2
 
@@ -75,9 +69,20 @@ class Question(Discourse):
     """
     This class represents a 'question' feature.
     """
-    def __init__(self):
-        super().__init__()
-        self._question_words = self._get_collection_from_file('question_words')
+    _size = 4
+    _unary = True
+
+    @classmethod
+    def extract_message(cls, message: Message, hyper_params=None):
+        """
+        This method checks if the message contains a question mark, and if it starts with a question word.
+
+        :param message: The message
+        :param hyper_params: The hyperparameters' dictionary
+        :return: The list of the two values
+        """
+        return [1 if '?' in message.text else 0,
+                1 if get_lexicon('question_words').match(message.processable_text.strip().lower()) else 0]
 
     @classmethod
     def extract(cls, message1: Message, message2: Message):
@@ -90,20 +95,12 @@ class Question(Discourse):
                                                         0 otherwise
                                    Same thing goes for the second message -- with the second message.
         """
-        one_hot = [0, 0, 0, 0]
+        question1 = cls.extract_message(message1)
+        question2 = cls.extract_message(message2)
+        one_hot = [question1[0], question2[0], question1[1], question2[1]]
 
         question_obj = cls()
 
-        one_hot[0] = 1 if '?' in message1.text else 0
-        one_hot[1] = 1 if '?' in message2.text else 0
-
-        for question_word in question_obj._question_words:
-            if re.search(rf'^{question_word}\b', message1.processable_text.strip().lower()):
-                one_hot[2] = 1
-
-            if re.search(rf'^{question_word}\b', message2.processable_text.strip().lower()):
-                one_hot[3] = 1
-
         question_obj.val = one_hot
         question_obj.message_1, question_obj.message_2 = message1, message2
 
@@ -114,6 +111,20 @@ class Long(Discourse):
     """
     This class represents a 'long' feature.
     """
+    _size = 2
+    _unary = True
+
+    @classmethod
+    def extract_message(cls, message: Message, hyper_params=None):
+        """
+        This method checks if the message is longer than 'discourse max words' words.
+
+        :param message: The message
+        :param hyper_params: The hyperparameters' dictionary
+        :return: [1] if the message is long, [0] otherwise
+        """
+        return [1 if len(message.words) > int(hyper_params['discourse max words']) else 0]
+
     @classmethod
     def extract(cls, message1: Message, message2: Message, words_n: int = 10):
         """
@@ -142,6 +153,24 @@ class Greet(Discourse):
     """
     This class represents a 'greeting' feature.
     """
+    _size = 2
+    _unary = True
+
+    @classmethod
+    def extract_message(cls, message: Message, hyper_params=None):
+        """
+        This method checks if the message contains a greeting expression.
+
+        :param message: The message
+        :param hyper_params: The hyperparameters' dictionary
+        :return: [1] if the message contains a greeting expression, [0] otherwise
+        """
+        for greet in ["hey", "hi", "hello"]:
+            if greet in message.words:
+                return [1]
+
+        return [0]
+
     @classmethod
     def extract(cls, message1: Message, message2: Message):
         """
@@ -153,12 +182,7 @@ class Greet(Discourse):
                                                         0 otherwise
                                    Same thing goes of the second message -- with the second message.
         """
-        one_hot = [0, 0]
-        for greet in ["hey", "hi", "hello"]:
-            if greet in message1.words:
-                one_hot[0] = 1
-            if greet in message2.words:
-                one_hot[1] = 1
+        one_hot = cls.extract_message(message1) + cls.extract_message(message2)
 
         long_obj = cls()
         long_obj.val = one_hot
@@ -171,6 +195,24 @@ class Thanks(Discourse):
     """
     This class represents a 'thank you' feature.
     """
+    _size = 2
+    _unary = True
+
+    @classmethod
+    def extract_message(cls, message: Message, hyper_params=None):
+        """
+        This method checks if the message contains a 'thank you' expression.
+
+        :param message: The message
+        :param hyper_params: The hyperparameters' dictionary
+        :return: [1] if the message contains a 'thank you' expression, [0] otherwise
+        """
+        for thanks in ["thank", "thanks", "thx", "ty", "grateful"]:
+            if thanks in message.words:
+                return [1]
+
+        return [0]
+
     @classmethod
     def extract(cls, message1: Message, message2: Message):
         """
@@ -182,12 +224,7 @@ class Thanks(Discourse):
                                                         0 otherwise
                                    Same thing goes of the second message -- with the second message.
         """
-        one_hot = [0, 0]
-        for thanks in ["thank", "thanks", "thx", "ty", "grateful"]:
-            if thanks in message1.words:
-                one_hot[0] = 1
-            if thanks in message2.words:
-                one_hot[1] = 1
+        one_hot = cls.extract_message(message1) + cls.extract_message(message2)
 
         long_obj = cls()
         long_obj.val = one_hot
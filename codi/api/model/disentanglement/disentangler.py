@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable
+
+from .context import Context
+from .feature import Feature
+from .pair_set import PairSet
+from .clustering import Clustering
+from .message_table import MessageTable
+
+if TYPE_CHECKING:
+    from .model import Model
+    from .vocabulary import Vocabulary
+    from .probability_memo import ProbabilityMemo
+    from ..input.message import Message
+
+
+class Disentangler:
+    """
+    This class represents the online disentanglement of a channel. The messages are pushed one at a time, in timestamp
+    order, and each message is assigned its conversation as soon as it is pushed. Only the messages that can still be
+    paired with the next messages are kept, together with the conversations they belong to, so the state is bounded by
+    the window of the model rather than by the length of the channel. The conversations are the same as the ones
+    predicted for the whole channel with the greedy clustering.
+
+    A stream of messages can also be disentangled in batches: the messages are buffered until they have
+    `stream max pairs` pairs, which are then scored with a single call of the classifier, so that the memory is bounded
+    by the window of the model and by the size of the batches.
+    """
+    def __init__(self,
+                 model: Model,
+                 features: [Feature] = Feature.get_default_features(),
+                 classifier=None,
+                 vocabulary: Vocabulary = None,
+                 max_pairs: int = None,
+                 probability_memo: ProbabilityMemo = None):
+        if classifier is None or vocabulary is None:
+            context = Context(*model._load_training_set())
+
+            if classifier is None:
+                model._use_trained_model(context, features)
+                classifier = context.classifier
+                probability_memo = context.probability_memo
+
+            if vocabulary is None:
+                vocabulary = model._get_training_vocabulary(context)
+
+        self._model = model
+        self._features = features
+        self._classifier = classifier
+        self._probability_memo = probability_memo
+        self._vocabulary = vocabulary
+        self._max_pairs = max_pairs if max_pairs is not None else int(model._constants['stream max pairs'])
+        self._history = MessageTable([], model._hyperparameters)
+        self._history_offset = 0
+        self._pending = 0
+        self._clustering = Clustering()
+
+    def __len__(self):
+        return len(self._clustering)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'Disentangler: [{len(self)} messages, {len(self._history)} in history]'
+
+    @property
+    def features(self):
+        """
+        :type: [Feature]
+        """
+        return self._features
+
+    @property
+    def classifier(self):
+        """
+        :type: Any
+        """
+        return self._classifier
+
+    @property
+    def vocabulary(self):
+        """
+        :type: Vocabulary
+        """
+        return self._vocabulary
+
+    @property
+    def max_pairs(self):
+        """
+        :type: int
+        """
+        return self._max_pairs
+
+    @property
+    def history(self):
+        """
+        :type: MessageTable
+        """
+        return self._history
+
+    @property
+    def clustering(self):
+        """
+        :type: Clustering
+        """
+        return self._clustering
+
+    def _append(self, message: Message):
+        """
+        Append a message to the history, without assigning it to a conversation yet.
+
+        :param message: The message, not older than the messages appended before
+        :return: The number of pairs of the message
+        """
+        history = self._history
+
+        if len(history) and MessageTable.get_timestamp(message) < history.timestamps[-1]:
+            raise Exception('The messages must be pushed in timestamp order')
+
+        history.append(message)
+
+        return len(history) - 1 - int(self._model._get_pair_starts(history.timestamps)[-1])
+
+    def _flush(self):
+        """
+        Assign the messages appended since the last flush to their conversations. The pairs of all the messages are
+        scored at once, then each message joins the conversation with the highest quality, or starts a new one.
+        Finally, the messages that can no longer be paired with the next messages are dropped.
+
+        :return: The generator of the ids of the conversations of the messages
+        """
+        history = self._history
+
+        if self._pending == len(history):
+            return
+
+        starts = self._model._get_pair_starts(history.timestamps)
+        pairs = PairSet(*self._model._get_pair_indices(history.timestamps, self._pending))
+
+        if len(pairs):
+            feature_matrix = Feature.get_feature_matrix(history,
+                                                        pairs.left,
+                                                        pairs.right,
+                                                        self._features,
+                                                        self._model._hyperparameters,
+                                                        self._vocabulary)
+            self._model._predict_max_entropy(feature_matrix, pairs, self._classifier, self._probability_memo)
+
+        offsets = pairs.get_offsets(len(history)).tolist()
+        right = (pairs.right + self._history_offset).tolist()
+        probabilities = pairs.probabilities.tolist()
+
+        for message in range(self._pending, len(history)):
+            # The messages older than the earliest message paired with this one can no longer be paired
+            horizon = int(starts[message]) + self._history_offset
+            conversation = self._clustering.add_message(right[offsets[message]:offsets[message + 1]],
+                                                        probabilities[offsets[message]:offsets[message + 1]],
+                                                        horizon)
+
+            self._clustering.forget_labels(horizon)
+            self._clustering.pop_closed_conversations()
+
+            history.messages[message].conversation = f'T{conversation + 1}'
+
+            yield history.messages[message].conversation
+
+        history.drop(int(starts[-1]))
+        self._history_offset += int(starts[-1])
+        self._pending = len(history)
+
+    def push(self, message: Message):
+        """
+        Assign the next message of the channel to a conversation. The message is paired with the messages of the
+        history, the pairs are scored with the trained model, and the message joins the conversation with the highest
+        quality, or starts a new one.
+
+        :param message: The message, not older than the messages pushed before
+        :return: The id of the conversation of the message
+        """
+        self._append(message)
+
+        return list(self._flush())[-1]
+
+    def disentangle(self, messages: Iterable[Message]):
+        """
+        Assign each message of a stream to a conversation. The messages are assigned in batches, as soon as they have
+        at least `max_pairs` pairs, so that only the messages of the window and of the current batch are in memory.
+
+        :param messages: The messages, in timestamp order
+        :return: The generator of the ids of the conversations of the messages, in the order of the messages
+        """
+        pairs_n = 0
+
+        for message in messages:
+            pairs_n += self._append(message)
+
+            if pairs_n >= self._max_pairs:
+                yield from self._flush()
+                pairs_n = 0
+
+        yield from self._flush()
@@ -1,18 +1,24 @@
 from __future__ import annotations
 
-import os
+import numpy
 
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from ..input.message import Message
     from ..input.community import Community
+    from .message_table import MessageTable
 
 
 class Feature:
     """
     This class represents a feature of a pair of messages.
     """
+    # The number of values of the feature, i.e. its number of columns in the feature matrix
+    _size = 1
+    # Whether the values of the feature for a pair are the alternated values of its two messages (see extract_message)
+    _unary = False
+
     def __init__(self):
         self._val = None
         self._message_1 = None
@@ -72,20 +78,64 @@ class Feature:
         """
         self._val = val
 
-    @staticmethod
-    def _get_collection_from_file(file_name: str):
+    @classmethod
+    def get_size(cls, hyper_params):
         """
-        Get a collection of words or phrases from the input file.
+        Get the number of values of the feature, i.e. its number of columns in the feature matrix.
 
-        :param file_name: The name of the file
-        :return: The collection of words
+        :param hyper_params: The hyperparameters' dictionary
+        :return: The number of values of the feature
         """
-        file_path = os.path.join(os.path.dirname(__file__), f'../../collections/{file_name}')
+        return cls._size
 
-        with open(file_path, 'r') as file:
-            collection = [line.strip() for line in file.readlines()]
+    @classmethod
+    def extract_batch(cls,
+                      table: MessageTable,
+                      left: numpy.ndarray,
+                      right: numpy.ndarray,
+                      out: numpy.ndarray,
+                      hyper_params,
+                      unigram_probabilities: {str: float}):
+        """
+        Extract the feature of all the given pairs straight into its columns of the feature matrix. As the classifiers
+        are trained on binary values, every value which is not 0 is written as 1. By default, the feature is extracted
+        pair by pair: the features override this method with a batch extraction.
+
+        :param table: The MessageTable of the messages sorted with respect to time
+        :param left: The indices of the first message of each pair
+        :param right: The indices of the second message of each pair
+        :param out: The columns of the feature matrix of the feature
+        :param hyper_params: The hyperparameters' dictionary
+        :param unigram_probabilities: The unigram probabilities of the words in the community
+        """
+        if cls._unary:
+            values = table.get_values(cls)
+            out[:, 0::2] = values[left]
+            out[:, 1::2] = values[right]
+            return
+
+        messages = table.messages
+
+        for k, (i, j) in enumerate(zip(left.tolist(), right.tolist())):
+            val = cls.get_features(messages[i], messages[j], [cls], hyper_params, unigram_probabilities)[0].val
+            out[k] = [value != 0 for value in val] if isinstance(val, list) else val != 0
 
-        return collection
+    @classmethod
+    def extract_messages_batch(cls, messages: [Message], hyper_params):
+        """
+        Extract the values of the feature for each message, for the features whose values for a pair are the
+        alternated values of its two messages (see MessageTable).
+
+        :param messages: The list of messages
+        :param hyper_params: The hyperparameters' dictionary
+        :return: The matrix of the values of each message
+        """
+        values = numpy.zeros((len(messages), cls._size // 2), dtype=numpy.uint8)
+
+        for i, message in enumerate(messages):
+            values[i] = cls.extract_message(message, hyper_params)
+
+        return values
 
     @staticmethod
     def get_default_features():
@@ -136,3 +186,37 @@ class Feature:
                 features.append(feature_type.extract(message_1, message_2))
 
         return features
+
+    @classmethod
+    def get_feature_matrix(cls,
+                           table: MessageTable,
+                           left: numpy.ndarray,
+                           right: numpy.ndarray,
+                           features_type_list: [Feature],
+                           hyper_params,
+                           unigram_probabilities: {str: float}):
+        """
+        Extract the features -- given by feature_type_list -- of all the given pairs of messages into a binary feature
+        matrix. The matrix has the same values as the flattened features of the pairs.
+
+        :param table: The MessageTable of the messages sorted with respect to time
+        :param left: The indices of the first message of each pair
+        :param right: The indices of the second message of each pair
+        :param features_type_list: The list of types of features to extract
+        :param hyper_params: The hyperparameters' dictionary
+        :param unigram_probabilities: The unigram probabilities of the words in the community
+        :return: The feature matrix of the pairs
+        """
+        sizes = [feature_type.get_size(hyper_params) for feature_type in features_type_list]
+        offsets = numpy.cumsum([0] + sizes)
+        feature_matrix = numpy.zeros((len(left), offsets[-1]), dtype=numpy.uint8)
+
+        for feature_type, start, stop in zip(features_type_list, offsets[:-1], offsets[1:]):
+            feature_type.extract_batch(table,
+                                       left,
+                                       right,
+                                       feature_matrix[:, start:stop],
+                                       hyper_params,
+                                       unigram_probabilities)
+
+        return feature_matrix
@@ -0,0 +1,236 @@
+import numpy
+
+
+class CompiledForest:
+    """
+    This class represents a trained random forest compiled into flat arrays of nodes, so that it can be evaluated with
+    NumPy alone. The nodes of all the trees are stored contiguously: the feature and the threshold of each split, the
+    two children of each node, and the class probabilities of each leaf. Every leaf is its own child, so that all the
+    trees are traversed together, one level at a time, for a whole batch of rows.
+
+    Since the feature vectors of the pairs are binary, each node also has the child reached when its feature is 0 and
+    the one reached when it is 1, so that the binary rows are traversed without comparing any threshold. The splits
+    that send both values to the same child are skipped altogether. The binary rows can also be given as packed bits,
+    as they are keyed in the memo of the predictions.
+
+    The probabilities are the same as the ones of the `predict_proba` of the forest it has been compiled from, since
+    the probabilities of the trees are added up in the same order.
+    """
+    def __init__(self,
+                 features: numpy.ndarray,
+                 thresholds: numpy.ndarray,
+                 children: numpy.ndarray,
+                 probabilities: numpy.ndarray,
+                 roots: numpy.ndarray,
+                 depth: int,
+                 classes: numpy.ndarray,
+                 features_n: int,
+                 max_rows: int = 4096):
+        self._features = features
+        self._thresholds = thresholds
+        self._children = children
+        self._probabilities = probabilities
+        self._roots = roots
+        self._depth = depth
+        self._classes = classes
+        self._features_n = features_n
+        self._max_rows = max_rows
+        self._binary_children, self._binary_roots = self._get_binary_children()
+
+    def __len__(self):
+        return len(self._roots)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'CompiledForest: [{len(self)} trees, {len(self._features)} nodes, depth {self._depth}]'
+
+    @property
+    def classes_(self):
+        """
+        :type: numpy.ndarray
+        """
+        return self._classes
+
+    @property
+    def features_n(self):
+        """
+        :type: int
+        """
+        return self._features_n
+
+    @property
+    def depth(self):
+        """
+        :type: int
+        """
+        return self._depth
+
+    @property
+    def max_rows(self):
+        """
+        :type: int
+        """
+        return self._max_rows
+
+    @classmethod
+    def compile(cls, classifier, max_rows: int = 4096):
+        """
+        Compile a trained random forest of a single output into flat arrays of nodes.
+
+        :param classifier: The trained RandomForestClassifier
+        :param max_rows: The maximum number of rows traversed at once, which bounds the memory of the traversal
+        :return: The CompiledForest
+        """
+        features, thresholds, children, probabilities, roots = [], [], [], [], []
+        nodes_n, depth = 0, 0
+
+        for estimator in classifier.estimators_:
+            tree = estimator.tree_
+            leaves = tree.children_left < 0
+            nodes = numpy.arange(nodes_n, nodes_n + tree.node_count)
+
+            # The probabilities of each leaf are normalized as in the predict_proba of the tree
+            values = tree.value[:, 0, :].astype(numpy.float64)
+            normalizers = values.sum(axis=1)[:, numpy.newaxis]
+            normalizers[normalizers == 0.0] = 1.0
+
+            features.append(numpy.where(leaves, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            children.append(numpy.stack([numpy.where(leaves, nodes, tree.children_left + nodes_n),
+                                         numpy.where(leaves, nodes, tree.children_right + nodes_n)], axis=1))
+            probabilities.append(values / normalizers)
+            roots.append(nodes_n)
+
+            nodes_n += tree.node_count
+            depth = max(depth, tree.max_depth)
+
+        return cls(numpy.concatenate(features).astype(numpy.int32),
+                   numpy.concatenate(thresholds),
+                   numpy.concatenate(children).reshape(-1).astype(numpy.int32),
+                   numpy.concatenate(probabilities),
+                   numpy.array(roots, dtype=numpy.int32),
+                   depth,
+                   classifier.classes_,
+                   classifier.n_features_in_,
+                   max_rows)
+
+    def _get_binary_children(self):
+        """
+        Get the child of each node reached when its feature is 0 and when it is 1. A feature goes right when it is
+        greater than the threshold of the split, so a split whose threshold is not between 0 and 1 sends both values to
+        the same child: such splits are skipped, by pointing to the first node below them that actually splits.
+
+        :return: The array of the two children of each node, and the array of the first node of each tree
+        """
+        binary_children = numpy.where(numpy.stack([0 > self._thresholds, 1 > self._thresholds], axis=1),
+                                      self._children[1::2, numpy.newaxis],
+                                      self._children[0::2, numpy.newaxis]).reshape(-1).astype(numpy.int32)
+        nodes = numpy.arange(len(self._features), dtype=numpy.int32)
+        skipped = (binary_children[0::2] == binary_children[1::2]) & (binary_children[0::2] != nodes)
+        targets = numpy.where(skipped, binary_children[0::2], nodes)
+
+        # The chains of skipped splits are followed until their first actual split or leaf
+        for _ in range(self._depth):
+            next_targets = targets[targets]
+
+            if numpy.array_equal(next_targets, targets):
+                break
+
+            targets = next_targets
+
+        return targets[binary_children], targets[self._roots]
+
+    def _get_leaves(self, feature_matrix: numpy.ndarray, binary: bool):
+        """
+        Traverse all the trees for a batch of rows, one level at a time. The paths that have reached a leaf are
+        dropped as they become many, so that only the paths still in progress are followed.
+
+        :param feature_matrix: The feature matrix of the batch
+        :param binary: Whether the features are all 0 or 1, given as uint8, so that the binary children are followed
+        :return: The array of the leaf reached by each row in each tree, of shape (trees, rows)
+        """
+        rows_n, features_n = feature_matrix.shape
+        values = feature_matrix.reshape(-1)
+        children = self._binary_children if binary else self._children
+        leaves = numpy.empty(len(self._roots) * rows_n, dtype=numpy.int32)
+        paths = numpy.arange(len(leaves), dtype=numpy.int32)
+        nodes = numpy.repeat(self._binary_roots if binary else self._roots, rows_n)
+        offsets = numpy.tile(numpy.arange(0, rows_n * features_n, features_n, dtype=numpy.int32), len(self._roots))
+
+        for _ in range(self._depth):
+            branches = values[offsets + self._features[nodes]]
+
+            if not binary:
+                branches = branches > self._thresholds[nodes]
+
+            next_nodes = children[2 * nodes + branches]
+            remaining = next_nodes != nodes
+            remaining_n = numpy.count_nonzero(remaining)
+
+            # Since the leaves are their own children, the paths that have arrived are only dropped once they are many
+            if remaining_n < len(paths) * 3 // 4:
+                leaves[paths] = next_nodes
+                paths, nodes, offsets = paths[remaining], next_nodes[remaining], offsets[remaining]
+            else:
+                nodes = next_nodes
+
+            if not remaining_n:
+                break
+
+        leaves[paths] = nodes
+
+        return leaves.reshape(len(self._roots), rows_n)
+
+    def _sum_probabilities(self, leaves: numpy.ndarray):
+        """
+        Average the probabilities of the leaves reached in every tree, adding them up in the order of the trees.
+
+        :param leaves: The array of the leaf reached by each row in each tree, of shape (trees, rows)
+        :return: The probabilities of each class of each row
+        """
+        probabilities = numpy.zeros((leaves.shape[1], len(self._classes)), dtype=numpy.float64)
+
+        for tree_leaves in leaves:
+            probabilities += self._probabilities[tree_leaves]
+
+        return probabilities / len(self._roots)
+
+    def predict_proba(self, feature_matrix: numpy.ndarray):
+        """
+        Compute the probabilities of each class of the rows of a feature matrix.
+
+        :param feature_matrix: The feature matrix
+        :return: The probabilities of each class of each row
+        """
+        feature_matrix = numpy.asarray(feature_matrix)
+        binary = bool(((feature_matrix == 0) | (feature_matrix == 1)).all())
+        probabilities = numpy.empty((len(feature_matrix), len(self._classes)), dtype=numpy.float64)
+
+        # The values that are not binary are compared in single precision, as in the forest
+        feature_matrix = feature_matrix.astype(numpy.uint8 if binary else numpy.float32)
+
+        for start in range(0, len(feature_matrix), self._max_rows):
+            leaves = self._get_leaves(numpy.ascontiguousarray(feature_matrix[start:start + self._max_rows]), binary)
+            probabilities[start:start + leaves.shape[1]] = self._sum_probabilities(leaves)
+
+        return probabilities
+
+    def predict_packed_proba(self, packed_matrix: numpy.ndarray):
+        """
+        Compute the probabilities of each class of binary feature vectors, given as packed bits. The bits are only
+        unpacked one batch of rows at a time.
+
+        :param packed_matrix: The matrix of the feature vectors packed into bits, as by numpy.packbits along the rows
+        :return: The probabilities of each class of each row
+        """
+        probabilities = numpy.empty((len(packed_matrix), len(self._classes)), dtype=numpy.float64)
+
+        for start in range(0, len(packed_matrix), self._max_rows):
+            leaves = self._get_leaves(numpy.unpackbits(packed_matrix[start:start + self._max_rows],
+                                                       axis=1,
+                                                       count=self._features_n), True)
+            probabilities[start:start + leaves.shape[1]] = self._sum_probabilities(leaves)
+
+        return probabilities
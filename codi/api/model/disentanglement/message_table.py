@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import numpy
+import datetime
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .feature import Feature
+    from .vocabulary import Vocabulary
+    from ..input.message import Message
+
+
+class MessageTable:
+    """
+    This class represents the per-message properties of the time sorted messages of a channel. Each property is
+    computed once per message, the first time it is used, and is then shared by all the pairs of the message, by all
+    the feature groups, and by all the validation runs. Messages can be appended and the oldest ones dropped, so that
+    the table can hold a sliding window of a channel. A table can also be compacted, keeping only the properties of its
+    messages, so that it can be sent to another process without the object graph of the community.
+    """
+    def __init__(self, messages: [Message], hyper_params):
+        self._messages = list(messages)
+        self._hyper_params = hyper_params
+        self._timestamps = None
+        self._author_uuids = None
+        self._authors = {}
+        self._author_ids = None
+        self._mentions = None
+        self._values = {}
+        self._word_ids = None
+        self._word_ids_vocabulary = None
+        self._word_ids_version = None
+
+    def __len__(self):
+        return len(self._messages) if self._messages is not None else len(self._timestamps)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'MessageTable: [{len(self)} messages]'
+
+    @property
+    def messages(self):
+        """
+        :type: [Message]
+        """
+        return self._messages
+
+    @property
+    def timestamps(self):
+        """
+        :type: numpy.ndarray
+        """
+        if self._timestamps is None:
+            self._timestamps = numpy.fromiter((self.get_timestamp(message) for message in self._messages),
+                                              dtype=numpy.int64,
+                                              count=len(self._messages))
+        return self._timestamps
+
+    @property
+    def author_uuids(self):
+        """
+        :type: [str]
+        """
+        if self._author_uuids is None:
+            self._author_uuids = [message.author.uuid for message in self._messages]
+        return self._author_uuids
+
+    @property
+    def author_ids(self):
+        """
+        :type: numpy.ndarray
+        """
+        if self._author_ids is None:
+            self._author_ids = numpy.array([self._authors.setdefault(author, len(self._authors))
+                                            for author in self.author_uuids], dtype=numpy.int64)
+        return self._author_ids
+
+    @property
+    def mentions(self):
+        """
+        :type: [{str}]
+        """
+        if self._mentions is None:
+            self._mentions = [set(message.get_member_mentions()) for message in self._messages]
+        return self._mentions
+
+    def append(self, message: Message):
+        """
+        Append a message, later than all the messages of the table. The properties already computed are computed for
+        the new message only.
+
+        :param message: The message
+        """
+        self._messages.append(message)
+
+        if self._timestamps is not None:
+            self._timestamps = numpy.append(self._timestamps, self.get_timestamp(message))
+
+        if self._author_uuids is not None:
+            self._author_uuids.append(message.author.uuid)
+
+        if self._author_ids is not None:
+            self._author_ids = numpy.append(self._author_ids,
+                                            self._authors.setdefault(message.author.uuid, len(self._authors)))
+
+        if self._mentions is not None:
+            self._mentions.append(set(message.get_member_mentions()))
+
+        for feature_type, values in self._values.items():
+            self._values[feature_type] = numpy.vstack([values,
+                                                       feature_type.extract_messages_batch([message],
+                                                                                           self._hyper_params)])
+
+        if self._word_ids is not None:
+            offsets, word_ids = self._word_ids
+            message_word_ids = self._word_ids_vocabulary.get_ids(message.processable_text)
+
+            self._word_ids = numpy.append(offsets, offsets[-1] + len(message_word_ids)), \
+                numpy.concatenate([word_ids, message_word_ids])
+
+    def drop(self, messages_n: int):
+        """
+        Drop the oldest messages, so that the indices of the remaining messages start from 0 again.
+
+        :param messages_n: The number of messages to drop
+        """
+        messages_n = min(messages_n, len(self._messages))
+
+        if messages_n <= 0:
+            return
+
+        self._messages = self._messages[messages_n:]
+
+        if self._timestamps is not None:
+            self._timestamps = self._timestamps[messages_n:]
+
+        if self._author_uuids is not None:
+            self._author_uuids = self._author_uuids[messages_n:]
+
+        if self._author_ids is not None:
+            self._author_ids = self._author_ids[messages_n:]
+
+        if self._mentions is not None:
+            self._mentions = self._mentions[messages_n:]
+
+        for feature_type, values in self._values.items():
+            self._values[feature_type] = values[messages_n:]
+
+        if self._word_ids is not None:
+            offsets, word_ids = self._word_ids
+            self._word_ids = offsets[messages_n:] - offsets[messages_n], word_ids[offsets[messages_n]:]
+
+    @staticmethod
+    def get_timestamp(message: Message):
+        """
+        Get the timestamp of the message in seconds.
+
+        :param message: The message
+        :return: The timestamp in seconds
+        """
+        if isinstance(message.timestamp, datetime.datetime):
+            return int(message.timestamp.timestamp())
+
+        return int(message.timestamp)
+
+    def compact(self, features_type_list: [Feature], vocabulary: Vocabulary):
+        """
+        Compute the properties of the messages used by the given features, and get a copy of the table without the
+        messages. Since every message refers to its author, its channel, and therefore to the whole community, the
+        compact table is much cheaper to send to another process. Its word ids are the ones of the given vocabulary,
+        even when a copy of the vocabulary is used later on.
+
+        :param features_type_list: The list of types of features that will be extracted from the table
+        :param vocabulary: The vocabulary of the community
+        :return: The compact table
+        """
+        from .feature import Feature
+
+        # Extracting the features of no pairs computes all the properties the features use
+        no_pairs = numpy.zeros(0, dtype=numpy.int64)
+        Feature.get_feature_matrix(self, no_pairs, no_pairs, features_type_list, self._hyper_params, vocabulary)
+
+        table = MessageTable([], dict(self._hyper_params))
+        table._messages = None
+        table._timestamps = self.timestamps
+        table._author_uuids = self._author_uuids
+        table._author_ids = self._author_ids
+        table._mentions = self._mentions
+        table._values = dict(self._values)
+        table._word_ids = self._word_ids
+
+        return table
+
+    def get_word_ids(self, vocabulary: Vocabulary):
+        """
+        Get the sorted ids of the words of each message that are in the vocabulary, concatenated. The ids of the words
+        of the i-th message are in the range [offsets[i], offsets[i + 1]) of the ids.
+
+        :param vocabulary: The vocabulary of the community
+        :return: The tuple of the offsets and of the ids
+        """
+        if self._messages is not None and (self._word_ids_vocabulary is not vocabulary
+                                           or self._word_ids_version != vocabulary.version):
+            word_ids = [vocabulary.get_ids(message.processable_text) for message in self._messages]
+            offsets = numpy.zeros(len(word_ids) + 1, dtype=numpy.int64)
+            numpy.cumsum([len(ids) for ids in word_ids], out=offsets[1:])
+
+            self._word_ids = offsets, numpy.concatenate(word_ids + [numpy.zeros(0, dtype=numpy.int64)])
+            self._word_ids_vocabulary = vocabulary
+            self._word_ids_version = vocabulary.version
+        return self._word_ids
+
+    def get_values(self, feature_type: Feature):
+        """
+        Get the values of a feature for each message, for the features whose values for a pair are the alternated
+        values of its two messages.
+
+        :param feature_type: The type of the feature
+        :return: The uint8 matrix with a row for each message
+        """
+        if feature_type not in self._values:
+            self._values[feature_type] = feature_type.extract_messages_batch(self._messages, self._hyper_params)
+        return self._values[feature_type]
+
+    def get_matrix(self, features_type_list: [Feature]):
+        """
+        Get the values of the given features for each message, side by side.
+
+        :param features_type_list: The list of types of features, whose values depend on a single message
+        :return: The uint8 matrix with a row for each message
+        """
+        return numpy.hstack([self.get_values(feature_type) for feature_type in features_type_list]
+                            + [numpy.zeros((len(self), 0), dtype=numpy.uint8)])
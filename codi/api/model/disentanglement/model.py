@@ -1,24 +1,32 @@
 import os
-import re
-from typing import Dict, Any, Tuple
+from typing import Dict, Any
+
+import glob
+import shutil
+import threading
+import hashlib
 
 import tqdm
 import time
 import json
 import numpy
 import pickle
-import datetime
 import configparser
+import multiprocessing
 
 # from nltk.classify import MaxentClassifier, megam
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
-# from imblearn.combine import SMOTETomek
-from imblearn.over_sampling import SMOTE
 
 from ..input.channel import Channel
 from ..input.message import Message
-from .relatedness import Relatedness
+from .context import Context
+from .forest import CompiledForest
+from .cascade import Cascade
+from .probability_memo import ProbabilityMemo
+from .pair_set import PairSet
+from .clustering import Clustering, VectorizedClustering, UnionFindClustering
+from .disentangler import Disentangler
+from .vocabulary import Vocabulary
+from .message_table import MessageTable
 from .conversation import Conversation
 from ..input.community import Community
 from ...utils.compute_statistics import *
@@ -26,201 +34,407 @@ from ...utils.decorators import measure_time
 from ..disentanglement.feature import Feature
 from ...utils.serialize_community import serialize_community
 
+# The state of a prediction worker process, set once by its initializer and shared by all the shards it scores
+_prediction_worker = None
+
+
+def _init_prediction_worker(hyperparameters: dict,
+                            features: [Feature],
+                            classifier,
+                            vocabulary: Vocabulary,
+                            memo_size: int,
+                            memo_entries: ([bytes], [Any], [float])):
+    """
+    Initialize a prediction worker process with the state shared by all the channels of the community. The memo of
+    the predictions of the worker starts from the entries of the memo of the model, and records the new entries, which
+    are sent back with the probabilities of each shard.
+
+    :param hyperparameters: The hyperparameters of the model
+    :param features: The list of features types
+    :param classifier: The trained classifier
+    :param vocabulary: The vocabulary of the community
+    :param memo_size: The maximum number of feature vectors of the memo of the predictions of the worker, 0 for none
+    :param memo_entries: The entries of the memo of the model
+    """
+    global _prediction_worker
+
+    config = configparser.ConfigParser()
+    config.read_dict({'hyperparameters': hyperparameters})
+
+    model = Model()
+    model._hyperparameters = config['hyperparameters']
+
+    probability_memo = None
+
+    if memo_size > 0:
+        probability_memo = ProbabilityMemo(memo_size, record_new_entries=True)
+        probability_memo.put(*memo_entries)
+        # The entries of the model are already in its memo
+        probability_memo.pop_new_entries()
+
+    _prediction_worker = model, features, classifier, vocabulary, probability_memo
+
+
+def _score_shard(task: (int, int, int, MessageTable)):
+    """
+    Compute the probabilities of the pairs owned by a shard of a channel, in a prediction worker process.
+
+    :param task: The index of the channel, the index of the shard, the index of the first message owned by the shard,
+                 and the compact MessageTable of the messages of the shard
+    :return: The index of the channel, the index of the shard, the probabilities of the pairs owned by the shard, and
+             the entries memoized by the worker while scoring the shard, None if it has no memo
+    """
+    index, shard, first, table = task
+    model, features, classifier, vocabulary, probability_memo = _prediction_worker
+
+    pairs = PairSet(*model._get_pair_indices(table.timestamps, first))
+
+    if len(pairs):
+        feature_matrix = model._extract_all_features(pairs, table, features, vocabulary, training=False)
+        model._predict_max_entropy(feature_matrix, pairs, classifier, probability_memo)
+
+    new_entries = probability_memo.pop_new_entries() if probability_memo is not None else None
+
+    return index, shard, pairs.probabilities, new_entries
+
 
 class Model:
     """
-    This class represents the model of the disentanglement.
+    This class represents the model of the disentanglement. The model only holds the configuration and the caches
+    of the trained models, shared by all the requests, while the state of each request is kept in its own Context, so
+    that several requests can use the same model at the same time.
     """
+    # The hyperparameters that change the trained classifier, and therefore identify a persisted model
+    _TRAINING_HYPERPARAMETERS = ['chat bins', 'max window size', 'discourse max words', 'previous n messages to check',
+                                 'classifier']
+
     def __init__(self):
         config = configparser.ConfigParser()
         config.read(os.path.join(os.path.dirname(__file__), '../../../../config.ini'))
 
-        self._gold_conversations = []
-        self._pred_conversations = []
-        self._unigram_probabilities = None
         self._constants = config['constants']
         self._hyperparameters = config['hyperparameters']
 
-        self._load()
+        # Guards the caches below, which are shared by the concurrent requests
+        self._lock = threading.RLock()
+        self._trained_models = {}
+        self._training_set = None, None, None
+        self._training_vocabulary = None, None
+
+    @staticmethod
+    def _get_models_path():
+        """
+        Get the directory in which the trained models are persisted, creating it if it does not exist.
+
+        :return: The path of the `models/` directory
+        """
+        path = os.path.join(os.path.dirname(__file__), '../../training/tmp/models')
+
+        os.makedirs(path, exist_ok=True)
 
-    def _save(self, model_type: str = None):
+        return path
+
+    @staticmethod
+    def _get_training_set_hash(training_set: Community):
+        """
+        Compute a fingerprint of the training set from the message fields that are used for training.
+
+        :param training_set: The training set
+        :return: The hexadecimal digest of the training set
+        """
+        digest = hashlib.sha256()
+
+        for channel in training_set.channels.values():
+            for message in channel.messages.values():
+                digest.update(json.dumps([message.uuid,
+                                          message.author.uuid,
+                                          str(message.timestamp),
+                                          message.original_text,
+                                          message.conversation]).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def _get_model_key(self, training_set_hash: str, features: [Feature]):
+        """
+        Get the key identifying a trained model, i.e. the training set, the feature set, and the hyperparameters
+        used to train it.
+
+        :param training_set_hash: The fingerprint of the training set
+        :param features: The list of features types
+        :return: The key of the trained model
+        """
+        key = json.dumps({
+            'training_set': training_set_hash,
+            'features': [feature.__name__ for feature in features],
+            'hyperparameters': {name: self._hyperparameters[name] for name in self._TRAINING_HYPERPARAMETERS}
+        }, sort_keys=True)
+
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+    def _save(self, key: str, classifier):
         """
         Save the trained model in the directory `models/`. This model will then be used for the prediction of
-        the POSTed community.
+        the POSTed community. At most `max saved models` models are kept, the least recently saved are removed. The
+        model is written to a temporary file first, so that a concurrent request never loads a partial model.
+
+        :param key: The key of the trained model
+        :param classifier: The trained classifier
         """
-        # Check if the `models/` directory exists
-        if not os.path.exists(os.path.join(os.path.dirname(__file__), '../../training/tmp/models')):
-            os.makedirs(os.path.join(os.path.dirname(__file__), '../../training/tmp/models'))
+        path = self._get_models_path()
+        model_path = os.path.join(path, f'model-{key}.pickle')
 
-        # Save the trained model
-        if model_type:
-            save_path = os.path.join(os.path.dirname(__file__), f'../../training/tmp/models/model-{model_type}.pickle')
-        else:
-            save_path = os.path.join(os.path.dirname(__file__), '../../training/tmp/models/model.pickle')
+        with open(f'{model_path}.{threading.get_ident()}.tmp', 'wb') as f:
+            pickle.dump(classifier, f)
+
+        os.replace(f'{model_path}.{threading.get_ident()}.tmp', model_path)
+
+        with self._lock:
+            saved_models = sorted(glob.glob(os.path.join(path, 'model-*.pickle')), key=os.path.getmtime)
 
-        with open(save_path, 'wb') as f:
-            pickle.dump(self._trained_model, f)
+            for saved_model in saved_models[:-int(self._constants['max saved models'])]:
+                os.remove(saved_model)
 
-    def _load(self, model_type: str = None):
+    def _load(self, key: str):
         """
         Load the model from a .pickle file.
 
-        :param model_type: The type of the model (i.e. the feature group name)
+        :param key: The key of the trained model
+        :return: The trained classifier, None if it has never been saved
         """
         try:
-            with open(os.path.join(os.path.dirname(__file__), '../../training/tmp/json/latest-training.json'),
-                      'r') as f:
-                json_obj = json.load(f)
-                self._training_set = Community().deserialize(json_obj)
+            with open(os.path.join(self._get_models_path(), f'model-{key}.pickle'), 'rb') as f:
+                return pickle.load(f)
         except FileNotFoundError:
-            self._training_set = None
+            return None
 
-        if model_type:
-            path = os.path.join(os.path.dirname(__file__), f'../../training/tmp/models/model-{model_type}.pickle')
-            print(f'loaded: model-{model_type}.pickle')
-        else:
-            path = os.path.join(os.path.dirname(__file__), '../../training/tmp/models/model.pickle')
+    def _save_vocabulary(self, training_set_hash: str, vocabulary: Vocabulary):
+        """
+        Save the vocabulary of a training set in the directory `models/`, next to the models trained on it. At most
+        `max saved models` vocabularies are kept, the least recently saved are removed.
 
-        try:
-            with open(path, 'rb') as f:
-                self._trained_model = pickle.load(f)
-        except FileNotFoundError:
-            self._trained_model = None
+        :param training_set_hash: The fingerprint of the training set
+        :param vocabulary: The vocabulary of the training set
+        """
+        path = self._get_models_path()
 
-    ###############################################################################################################
-    # Perform step 1: Max Entropy Classifier                                                                      #
-    ###############################################################################################################
-    # All the following functions are used in order to compute the Max Entropy Classifier for the given data set. #
-    # This is the first step of the conversation disentanglement process.                                         #
-    ###############################################################################################################
-    def _in_window(self, message_1: Message, message_2: Message):
+        with self._lock:
+            vocabulary.save(os.path.join(path, f'vocabulary-{training_set_hash[:16]}'))
+
+            saved_vocabularies = sorted(glob.glob(os.path.join(path, 'vocabulary-*')), key=os.path.getmtime)
+
+            for saved_vocabulary in saved_vocabularies[:-int(self._constants['max saved models'])]:
+                shutil.rmtree(saved_vocabulary)
+
+            self._training_vocabulary = vocabulary, training_set_hash
+
+    def _get_cached_training_vocabulary(self, training_set_hash: str):
         """
-        Check if the two messages are within a 129 seconds window.
+        Get the vocabulary of a training set, if it is the last one that has been used.
 
-        :param message_1: The first message
-        :param message_2: The second message
-        :return: True if the two messages are within a 129 seconds window,
-                 False otherwise
+        :param training_set_hash: The fingerprint of the training set
+        :return: The vocabulary of the training set, None if it is not in memory
         """
-        message1_timestamp = message_1.timestamp
-        message2_timestamp = message_2.timestamp
+        vocabulary, vocabulary_hash = self._training_vocabulary
 
-        if isinstance(message1_timestamp, datetime.datetime):
-            diff = abs(int(message2_timestamp.timestamp()) - int(message1_timestamp.timestamp()))
-        else:
-            diff = abs(int(message2_timestamp) - int(message1_timestamp))
+        return vocabulary if vocabulary_hash == training_set_hash else None
 
-        # FIXME Marco removed pairs with equal to have same output as EC-modded-algorithm
-        return diff < int(self._hyperparameters['max window size'])
+    def _get_training_vocabulary(self, context: Context):
+        """
+        Get the vocabulary of the training set of the request, i.e. the unigram probabilities the model has been
+        trained with. The vocabulary is taken from memory if possible, otherwise it is loaded from disk, and it is
+        computed again only if it has never been saved.
+
+        :param context: The context of the request
+        :return: The vocabulary of the training set
+        """
+        if context.training_set_hash is None:
+            raise Exception('No training set available, the model must be trained first')
+
+        vocabulary = self._get_cached_training_vocabulary(context.training_set_hash)
+
+        if vocabulary is None:
+            vocabulary = Vocabulary.load(os.path.join(self._get_models_path(),
+                                                      f'vocabulary-{context.training_set_hash[:16]}'))
+
+            if vocabulary is None:
+                vocabulary = self.get_vocabulary(context.training_set)
+                self._save_vocabulary(context.training_set_hash, vocabulary)
+            else:
+                self._training_vocabulary = vocabulary, context.training_set_hash
+
+        return vocabulary
+
+    def _load_training_set(self):
+        """
+        Load the latest training set. The training set is deserialized again only if its file has changed since the
+        last time it has been loaded.
+
+        :return: The training set and its fingerprint, None and None if no training set has been posted yet
+        """
+        path = os.path.join(os.path.dirname(__file__), '../../training/tmp/json/latest-training.json')
+
+        with self._lock:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._training_set = None, None, None
+                return None, None
+
+            if self._training_set[2] != (stat.st_mtime_ns, stat.st_size):
+                with open(path, 'r') as f:
+                    training_set = Community().deserialize(json.load(f))
 
-    def _get_previous_n_pairs(self, messages: [Message], message_index: int):
+                self._training_set = training_set, self._get_training_set_hash(training_set), \
+                    (stat.st_mtime_ns, stat.st_size)
+
+            return self._training_set[:2]
+
+    def _memoize(self, key: str, classifier):
         """
-        Given a message and its index, get all the pairs between the message and the previous n messages. in this case n
-        is a hyperparameter.
+        Keep a trained model in memory, evicting the least recently added models when more than `max saved models`
+        models are memoized. The model is kept with an empty memo of its predictions, of at most
+        `probability memo size` feature vectors, so that the predictions of a replaced model are never used. A random
+        forest, also the one of a Cascade, is kept compiled into a CompiledForest if `compile forest` is set.
 
-        :param messages: The list of messages
-        :param message_index: The index of the message
-        :return: The list of pairs
+        :param key: The key of the trained model
+        :param classifier: The trained classifier
         """
-        pairs = []
-        pairs_indices = []
-        i = message_index - 1
+        memo_size = int(self._constants['probability memo size'])
+
+        if self._constants.getboolean('compile forest'):
+            # A trained forest has estimators, checked without importing scikit-learn
+            if hasattr(classifier, 'estimators_'):
+                classifier = CompiledForest.compile(classifier)
+            elif isinstance(classifier, Cascade) and hasattr(classifier.forest, 'estimators_'):
+                classifier = Cascade(classifier.screen, CompiledForest.compile(classifier.forest))
 
-        while i >= 0 and message_index - i <= int(self._hyperparameters['previous n messages to check']):
-            pairs.append((messages[message_index], messages[i]))
-            pairs_indices.append((message_index, i))
-            i -= 1
+        with self._lock:
+            self._trained_models[key] = classifier, ProbabilityMemo(memo_size) if memo_size > 0 else None
 
-        return pairs, pairs_indices
+            while len(self._trained_models) > int(self._constants['max saved models']):
+                self._trained_models.pop(next(iter(self._trained_models)))
 
-    def _get_more_pairs_if_in_window(self, messages: [Message], message_index: int):
+    def _use_trained_model(self, context: Context, features: [Feature]):
         """
-        Given a message, get all the pairs that lie within a self._hyperparameters['max window size'] seconds window
-        and are not the pairs with the previous self._hyperparameters['previous n messages to check'] messages.
+        Set the model trained on the training set of the request with the given features as the classifier of the
+        request. The model is taken from memory if possible, otherwise it is loaded from disk. The model is trained only
+        if it has never been trained before.
 
-        :param messages: The list of messages
-        :param message_index: The index of the message
-        :return: The list of pairs
+        :param context: The context of the request
+        :param features: The list of features types
+        :return: The training time (0 if the model was already trained)
         """
-        pairs = []
-        pairs_indices = []
-        i = message_index - int(self._hyperparameters['previous n messages to check']) - 1
+        if context.training_set_hash is None:
+            raise Exception('No training set available, the model must be trained first')
 
-        while i >= 0 and self._in_window(messages[message_index], messages[i]):
-            pairs.append((messages[message_index], messages[i]))
-            pairs_indices.append((message_index, i))
-            i -= 1
+        key = self._get_model_key(context.training_set_hash, features)
+        classifier, context.probability_memo = self._trained_models.get(key, (None, None))
+        train_time = 0.0
 
-        return pairs, pairs_indices
+        if classifier is None:
+            classifier = self._load(key)
 
-    # Message Relatedness
+            if classifier is None:
+                classifier, train_time = self.train(context.training_set, features)
+            else:
+                self._memoize(key, classifier)
+
+            classifier, context.probability_memo = self._trained_models.get(key, (classifier, None))
+
+        context.classifier = classifier
+
+        return train_time
 
-    def _get_all_pairs(self, messages: [Message]):
+    ###############################################################################################################
+    # Perform step 1: Max Entropy Classifier                                                                      #
+    ###############################################################################################################
+    # All the following functions are used in order to compute the Max Entropy Classifier for the given data set. #
+    # This is the first step of the conversation disentanglement process.                                         #
+    ###############################################################################################################
+    def _get_pair_starts(self, timestamps: numpy.ndarray):
         """
-        Get all the pairs of messages. For every message, create pairs with the messages in the 129 seconds window.
-        Moreover, create pairs also with the previous 4 messages.
+        Get the index of the earliest message paired with each message. Every message is paired with the previous
+        self._hyperparameters['previous n messages to check'] messages, and with all the previous messages that lie
+        within a self._hyperparameters['max window size'] seconds window.
 
-        :param messages: The list of messages sorted with respect to time
-        :return: The list of Relatedness objects
+        :param timestamps: The sorted array of the timestamps of the messages
+        :return: The array of the indices of the earliest paired messages, each message is paired with all the
+                 messages from its start to itself (excluded)
         """
-        all_pairs = []
-        all_pairs_indices = []
-        pairs_objs = []
+        previous_n = int(self._hyperparameters['previous n messages to check'])
+        max_window_size = int(self._hyperparameters['max window size'])
 
-        for i in tqdm.tqdm(range(len(messages)), desc='Creating pairs'):
-            pairs = []
-            pairs_indices = []
-            previous_pairs, previous_indices = self._get_previous_n_pairs(messages, i)
-            pairs.extend(previous_pairs)
-            pairs_indices.extend(previous_indices)
-            window_pairs, window_indices = self._get_more_pairs_if_in_window(messages, i)
-            pairs.extend(window_pairs)
-            pairs_indices.extend(window_indices)
+        indices = numpy.arange(len(timestamps), dtype=numpy.int64)
 
-            # Reverse ordering to preserve temporal sorting of pairs
-            pairs = list(reversed(pairs))
-            pairs_indices = list(reversed(pairs_indices))
-            all_pairs.extend(pairs)
-            all_pairs_indices.extend(pairs_indices)
+        # FIXME Marco removed pairs with equal to have same output as EC-modded-algorithm
+        window_start = numpy.searchsorted(timestamps, timestamps - max_window_size, side='right')
+
+        return numpy.minimum(window_start, numpy.maximum(indices - previous_n, 0))
+
+    def _get_pair_indices(self, timestamps: numpy.ndarray, first: int = 0):
+        """
+        Get the indices of all the pairs of messages, i.e. of each message with the messages from its start to itself
+        (excluded).
+
+        :param timestamps: The sorted array of the timestamps of the messages
+        :param first: The index of the first message whose pairs are needed, the earlier messages are only paired with
+                      the later ones
+        :return: The arrays of the indices of the left (i.e. later) and right message of each pair, sorted with
+                 respect to time
+        """
+        indices = numpy.arange(first, len(timestamps), dtype=numpy.int64)
+        start = self._get_pair_starts(timestamps)[first:]
+        counts = indices - start
 
-        for msg1, msg2 in all_pairs:
-            pair_obj = Relatedness()
-            pair_obj.message1 = msg1
-            pair_obj.message2 = msg2
+        left = numpy.repeat(indices, counts)
+        offsets = numpy.repeat(numpy.cumsum(counts) - counts - start, counts)
+        right = numpy.arange(len(left), dtype=numpy.int64) - offsets
 
-            pairs_objs.append(pair_obj)
+        return left, right
 
-        return pairs_objs
+    # Message Relatedness
+
+    def _get_all_pairs(self, table: MessageTable):
+        """
+        Get all the pairs of messages. For every message, create pairs with the messages in the max window size.
+        Moreover, create pairs also with the previous n messages.
+
+        :param table: The MessageTable of the messages sorted with respect to time
+        :return: The PairSet of the pairs
+        """
+        return PairSet(*self._get_pair_indices(table.timestamps))
 
     def _extract_all_features(self,
-                              pairs: [Relatedness],
+                              pairs: PairSet,
+                              table: MessageTable,
                               features: [Feature],
                               unigram_probabilities: {str: float},
                               training: bool = True):
         """
-        Extract all the features from the pairs.
+        Extract all the features from the pairs into a binary feature matrix. When training, the labels of the pairs
+        are set as well.
 
-        :param pairs: The list of pairs
+        :param pairs: The PairSet of the pairs
+        :param table: The MessageTable of the messages sorted with respect to time
         :param features: The list of features types
         :param training: Whether we are training the model or not
         :param unigram_probabilities: A dictionary containing the probability of each word
-        :return: The list of extracted features
+        :return: The feature matrix
         """
-        labels = []
-        feature_matrix = []
+        feature_matrix = Feature.get_feature_matrix(table,
+                                                    pairs.left,
+                                                    pairs.right,
+                                                    features,
+                                                    self._hyperparameters,
+                                                    unigram_probabilities)
 
-        for pair in tqdm.tqdm(pairs, desc='Extracting features'):
-            feat_vec = Feature.get_features(pair.message1,
-                                            pair.message2,
-                                            features,
-                                            self._hyperparameters,
-                                            unigram_probabilities)
-            feature_matrix.append([feature for feature in feat_vec])
+        if training:
+            conversations = {}
+            conversation_ids = numpy.array([conversations.setdefault(message.conversation, len(conversations))
+                                            for message in table.messages], dtype=numpy.int64)
+            pairs.labels = conversation_ids[pairs.left] == conversation_ids[pairs.right]
 
-            if training:
-                labels.append(int(pair.message1.conversation == pair.message2.conversation))
-
-        return feature_matrix, labels if training else feature_matrix
+        return feature_matrix
 
     @staticmethod
     def _flatten_features(feature_matrix: [[Feature]]):
@@ -247,100 +461,170 @@ class Model:
 
         return flattened_matrix
 
+    @staticmethod
+    def _fit_random_forest(feature_matrix: numpy.ndarray, labels: numpy.ndarray):
+        """
+        Given the feature matrix, train a random forest on the pairs oversampled with SMOTE.
+
+        :param feature_matrix: The binary feature matrix
+        :param labels: The array of labels
+        :return: The trained RandomForestClassifier
+        """
+        # scikit-learn and imbalanced-learn are only imported to train, so that the prediction workers run without them
+        from sklearn.ensemble import RandomForestClassifier
+        # from imblearn.combine import SMOTETomek
+        from imblearn.over_sampling import SMOTE
+
+        sm = SMOTE()
+        features_resampled, labels_resampled = sm.fit_resample(feature_matrix, labels)
+        return RandomForestClassifier(n_estimators=500).fit(features_resampled, labels_resampled)
+
+    @staticmethod
+    def _fit_logistic_regression(feature_matrix: numpy.ndarray, labels: numpy.ndarray):
+        """
+        Given the feature matrix, train a logistic regression.
+
+        :param feature_matrix: The binary feature matrix
+        :param labels: The array of labels
+        :return: The trained LogisticRegression
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        return LogisticRegression(random_state=0, tol=1e-14, max_iter=100000, C=numpy.inf)\
+            .fit(feature_matrix, labels)
+
     @measure_time
-    def _compute_max_entropy(self, feature_matrix: [[Feature]], labels: [int]):
+    def _compute_max_entropy(self, feature_matrix: numpy.ndarray, labels: [int]):
         """
         Given the feature matrix, compute the Max Entropy classifier.
 
-        :param feature_matrix: The matrix of the feature objects
+        :param feature_matrix: The binary feature matrix
         :param labels: The vector of labels
+        :return: The trained classifier
         """
         labels = numpy.array(labels)
-        flattened_matrix = numpy.array(self._flatten_features(feature_matrix))
 
         classifier = self._hyperparameters['classifier']
         if classifier == 'RANDOM_FOREST':
-            sm = SMOTE()
-            features_resampled, labels_resampled = sm.fit_resample(flattened_matrix, labels)
-            self._trained_model = RandomForestClassifier(n_estimators=500).fit(features_resampled, labels_resampled)
+            return self._fit_random_forest(feature_matrix, labels)
         elif classifier == 'LOGISTIC_REGRESSION':
-            self._trained_model = LogisticRegression(random_state=0, tol=1e-14, max_iter=100000, penalty='none')\
-                .fit(flattened_matrix, labels)
+            return self._fit_logistic_regression(feature_matrix, labels)
+        elif classifier == 'CASCADE':
+            return Cascade(self._fit_logistic_regression(feature_matrix, labels),
+                           self._fit_random_forest(feature_matrix, labels))
         # elif classifier == 'MEGAM':
             # megam.config_megam(os.path.join(os.path.dirname(__file__), '../../utils/megam_0.92'))
-            # features = [({str(index): elem for (index, elem) in enumerate(a)}, b) for (a, b) in zip(flattened_matrix,
+            # features = [({str(index): elem for (index, elem) in enumerate(a)}, b) for (a, b) in zip(feature_matrix,
             #                                                                                         labels)]
             #
-            # self._trained_model = MaxentClassifier.train(features, 'megam', trace=0, max_iter=1000, min_lldelta=0.001)
+            # return MaxentClassifier.train(features, 'megam', trace=0, max_iter=1000, min_lldelta=0.001)
         else:
             raise RuntimeError(f"Unsupported classifier: {classifier}")
 
-    @measure_time
-    def _predict_max_entropy(self, feature_matrix: [[Feature]], pairs: [Relatedness], group: str = None)\
-            -> Tuple[Any, Dict[str, Dict[str, Relatedness]]]:
-        # FIXME the type Any in this hinting should be resolved to the actual type by providing an interface for
-        #  trained models with basic methods that can be called on all trained models (e.g., predict)
-        #  with appropriate type hinting
+    @staticmethod
+    def _get_unique_rows(feature_matrix: numpy.ndarray):
         """
-        Given a feature matrix, compute a prediction of its Maximum Entropy.
+        Find the distinct rows of a binary feature matrix. The rows are packed into bits, so that each row is compared
+        as a single short byte string, which is also its key in the memo of the predictions.
 
-        :param feature_matrix: The matrix of the feature objects
-        :param pairs: The list of generated pairs
+        :param feature_matrix: The binary feature matrix
+        :return: The packed bits of each distinct row, the index of a row for each distinct row, and the index of the
+                 distinct row of each row
         """
-        pairs_and_predictions = {}
+        packed_matrix = numpy.ascontiguousarray(numpy.packbits(feature_matrix != 0, axis=1))
+        keys = packed_matrix.view(numpy.dtype((numpy.void, packed_matrix.shape[1]))).reshape(-1)
+        unique_keys, indices, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
 
-        flattened_matrix = numpy.array(self._flatten_features(feature_matrix))
+        return unique_keys.tolist(), indices, inverse.reshape(-1)
 
-        self._load(group)
+    def _classify(self, feature_matrix: numpy.ndarray, trained_model, packed_matrix: numpy.ndarray = None):
+        """
+        Classify the rows of a feature matrix. The classifier is evaluated once, and the predicted labels are derived
+        from the probabilities, as the class with the highest probability.
+
+        :param feature_matrix: The binary feature matrix
+        :param trained_model: The trained classifier
+        :param packed_matrix: The rows packed into bits, which a CompiledForest evaluates instead of the rows
+        :return: The predicted label and the probability of each row, and the number of rows escalated to the forest
+                 of a Cascade
+        """
+        escalated_n = 0
 
         classifier = self._hyperparameters['classifier']
         if classifier == 'MEGAM':
-            features = [({str(index): elem for (index, elem) in enumerate(a)}) for a in flattened_matrix]
-            predictions = self._trained_model.classify_many(features)
-            probabilities = self._trained_model.prob_classify_many(features)
+            features = [({str(index): elem for (index, elem) in enumerate(a)}) for a in feature_matrix]
+            probabilities = trained_model.prob_classify_many(features)
+            predictions = numpy.array([probability.max() for probability in probabilities])
+            probabilities = numpy.array([probability.prob(1) for probability in probabilities])
         elif classifier == 'LOGISTIC_REGRESSION' or classifier == 'RANDOM_FOREST':
-            predictions = self._trained_model.predict(flattened_matrix)
-            probabilities = self._trained_model.predict_proba(flattened_matrix)
+            if isinstance(trained_model, CompiledForest) and packed_matrix is not None:
+                probabilities = trained_model.predict_packed_proba(packed_matrix)
+            else:
+                probabilities = trained_model.predict_proba(feature_matrix)
+            predictions = trained_model.classes_.take(probabilities.argmax(axis=1))
+            probabilities = probabilities[:, 1]
+        elif classifier == 'CASCADE':
+            probabilities, escalated = trained_model.predict_proba(feature_matrix,
+                                                                   float(self._hyperparameters['cascade lower bound']),
+                                                                   float(self._hyperparameters['cascade upper bound']),
+                                                                   packed_matrix)
+            escalated_n = int(numpy.count_nonzero(escalated))
+            predictions = trained_model.classes_.take(probabilities.argmax(axis=1))
+            probabilities = probabilities[:, 1]
         else:
             raise RuntimeError(f"Unsupported classifier: {classifier}")
 
-        # FIXME Marco added forcing of predictions to test greedy
-        # fake_predictions = []
-        # # with open("temp_debug_classifier_predictions_python_mar_2020.csv") as f:
-        # with open("temp_debug_classifier_predictions_test_disco.csv") as f:
-        #     lines = f.readlines()
-        #     for line in lines:
-        #         pred, relatedness = line.split()
-        #         fake_predictions.append((int(pred), float(relatedness)))
-
-        # total_discrepancy = 0.0
-        # total_wrong_predictions = 0
-        for i, pair in enumerate(pairs):
-            # TODO this checks can be optimized with a function to extract percentages for each classifier
-            if classifier == 'MEGAM':
-                pair.percentage = probabilities[i].prob(1)
-            elif classifier == 'LOGISTIC_REGRESSION' or classifier == 'RANDOM_FOREST':
-                pair.percentage = probabilities[i][1]
-                # total_discrepancy += abs(probabilities[i][1] - fake_predictions[i][1])
-                # pair.percentage = fake_predictions[i][1]
-                # if predictions[i] != fake_predictions[i][0]:
-                #     # t1 = pair.message1
-                #     # t2 = pair.message2
-                #     # t3 = pair.percentage
-                #     # t4 = flattened_matrix[i]
-                #     total_wrong_predictions += 1
-                # predictions[i] = fake_predictions[i][0]
-            else:
-                raise RuntimeError(f"Unsupported classifier: {classifier}")
+        return predictions, probabilities, escalated_n
 
-            if pair.message1.uuid in pairs_and_predictions:
-                pairs_and_predictions[pair.message1.uuid][pair.message2.uuid] = pair
-            else:
-                pairs_and_predictions[pair.message1.uuid] = {pair.message2.uuid: pair}
+    @measure_time
+    def _predict_max_entropy(self,
+                             feature_matrix: numpy.ndarray,
+                             pairs: PairSet,
+                             trained_model,
+                             probability_memo: ProbabilityMemo = None) -> Any:
+        # FIXME the type Any in this hinting should be resolved to the actual type by providing an interface for
+        #  trained models with basic methods that can be called on all trained models (e.g., predict)
+        #  with appropriate type hinting
+        """
+        Given a feature matrix, compute a prediction of its Maximum Entropy. The probability of each pair is stored in
+        the PairSet. Since many pairs have the same features, only the distinct rows of the matrix are considered, and
+        their predictions are broadcast back to the pairs. The distinct rows are looked up in the memo of the
+        predictions of the classifier first, and only the rows that are not memoized are classified.
+
+        :param feature_matrix: The binary feature matrix
+        :param pairs: The PairSet of the generated pairs
+        :param trained_model: The trained classifier
+        :param probability_memo: The memo of the predictions of the classifier, None to classify all the rows
+        :return: The predicted labels, and the statistics of the inference: the ratio of the distinct rows to the rows
+                 of the matrix, the ratio of the distinct rows found in the memo, and the ratio of the classified rows
+                 escalated to the forest of a Cascade
+        """
+        keys, indices, inverse = self._get_unique_rows(feature_matrix)
+        escalated_n = 0
+        values = probability_memo.get(keys) if probability_memo is not None else [None] * len(keys)
+        missing = [row for row, value in enumerate(values) if value is None]
+
+        if missing:
+            packed_matrix = numpy.frombuffer(b''.join([keys[row] for row in missing]),
+                                             dtype=numpy.uint8).reshape(len(missing), -1)
+            predictions, probabilities, escalated_n = self._classify(feature_matrix[indices[missing]],
+                                                                     trained_model,
+                                                                     packed_matrix)
+            predictions, probabilities = predictions.tolist(), probabilities.tolist()
+
+            if probability_memo is not None:
+                probability_memo.put([keys[row] for row in missing], predictions, probabilities)
 
-        # print(f"Total discrepancy with faked data: {total_discrepancy}")
-        # print(f"Total wrong predictions: {total_wrong_predictions}")
-        return predictions, pairs_and_predictions
+            for row, prediction, probability in zip(missing, predictions, probabilities):
+                values[row] = prediction, probability
+
+        pairs.probabilities = numpy.array([probability for _, probability in values], dtype=numpy.float64)[inverse]
+
+        return numpy.array([prediction for prediction, _ in values])[inverse], {
+            'unique_pairs_ratio': len(keys) / max(len(feature_matrix), 1),
+            'memo_hit_rate': (len(keys) - len(missing)) / max(len(keys), 1),
+            'escalated_ratio': escalated_n / max(len(missing), 1),
+        }
 
     ###############################################################################################################
     # Perform step 2: Conversation Clustering                                                                     #
@@ -349,87 +633,186 @@ class Model:
     # Entropy Classifier and the community messages. This is the second and final step of the conversation        #
     # disentanglement process.                                                                                    #
     ###############################################################################################################
-    @staticmethod
-    def _compute_weight(probability: float):
+    @measure_time
+    def _cluster_messages(self, pairs: PairSet, messages_n: int):
         """
-        Given a probability, compute the weight of the pair.
+        Given the pairs of messages and their probabilities, cluster the conversations.
 
-        :param probability: The probability of the pair of messages
+        :param pairs: The PairSet of the pairs and their probabilities
+        :param messages_n: The number of messages of the channel
+        :return: The conversation of each message, numbered from 1
         """
-        # return numpy.log(probability / (1 - probability))
-        return probability - .5
+        clustering = self._hyperparameters['clustering']
+        if clustering == 'GREEDY':
+            labels = Clustering().cluster(pairs, messages_n)
+        elif clustering == 'VECTORIZED':
+            labels = VectorizedClustering().cluster(pairs, messages_n)
+        elif clustering == 'UNION_FIND':
+            labels = UnionFindClustering(self._hyperparameters.getfloat('union find threshold'),
+                                         self._hyperparameters.getboolean('union find best link')).cluster(pairs,
+                                                                                                          messages_n)
+        else:
+            raise RuntimeError(f"Unsupported clustering: {clustering}")
 
-    @staticmethod
-    def _get_pair_probability(pairs: Dict[str, Relatedness], second_message: Message) -> float:
-        try:
-            probability = pairs[second_message.uuid].percentage
-        except KeyError:
-            probability = 0.5
-        return probability
+        return [label + 1 for label in labels]
 
-    def _get_qualities_from_clusters(self,
-                                     conversations: [Conversation],
-                                     pairs: Dict[str, Relatedness]):
+    def _get_prediction_workers(self):
         """
-        Given a list of clusters, return The sum of the weights of the nodes in the cluster.
+        Get the number of processes used to predict the channels of a community, one per CPU if `prediction workers`
+        is 0.
 
-        :param conversations: The list of clusters
-        :param pairs: The dictionary of pairs and associated probabilities for a given message
-        :return The sum of the weights of the nodes for each cluster
+        :return: The number of processes
         """
-        qualities = [(-1, 0.0)] * len(conversations)
+        workers = int(self._constants['prediction workers'])
 
-        for i, cluster in enumerate(conversations):
-            quality_sum = 0.0
+        return workers if workers > 0 else os.cpu_count()
 
-            for second_message in cluster.messages:
-                quality_sum += self._compute_weight(self._get_pair_probability(pairs, second_message))
-            qualities[i] = (i, quality_sum)
+    def _get_shards(self, timestamps: numpy.ndarray):
+        """
+        Split the time sorted messages of a channel into shards of at most `prediction shard size` messages. Each shard
+        owns the pairs of its messages, and also holds the earlier messages paired with them, i.e. the messages of the
+        window and the previous n messages before its first message. The shards overlap, but every pair is owned by
+        exactly one shard.
+
+        :param timestamps: The sorted array of the timestamps of the messages
+        :return: The list of the index of the first message held, of the first message owned, and of the message after
+                 the last message of each shard
+        """
+        shard_size = int(self._constants['prediction shard size'])
+        starts = self._get_pair_starts(timestamps)
 
-        return qualities
+        return [(int(starts[first]), first, min(first + shard_size, len(timestamps)))
+                for first in range(0, len(timestamps), shard_size)]
 
-    @measure_time
-    def _cluster_messages(self, pairs: Dict[str, Dict[str, Relatedness]], messages: {str, Message}):
+    def _predict_channels(self, context: Context, channels: [Channel], features: [Feature], workers: int):
+        """
+        Divide the messages of each channel into conversations, fanning the shards of the channels out to a pool of
+        processes. Each process receives the classifier and the vocabulary of the request once, then a compact
+        MessageTable for each shard, and sends back the probabilities of the pairs the shard owns. As soon as all the
+        shards of a channel are scored, their probabilities are merged in the order of the pairs, and the messages of
+        the channel are clustered, which is the only sequential step. The largest channels are sent first, so that the
+        processes are kept busy. The memos of the processes start from the memo of the model, and the entries they
+        memoize are merged back into it.
+
+        :param context: The context of the request, with its classifier and vocabulary
+        :param channels: The channels with at least a message
+        :param features: The list of features types
+        :param workers: The number of processes
         """
-        Given a dictionary of message pairs and their probabilities, cluster the conversations.
+        time_sorted_messages_dicts = [dict(sorted(channel.messages.items(), key=lambda message: message[1].timestamp))
+                                      for channel in channels]
+        timestamps = [MessageTable(time_sorted_messages_dict.values(), self._hyperparameters).timestamps
+                      for time_sorted_messages_dict in time_sorted_messages_dicts]
+        shards = [self._get_shards(channel_timestamps) for channel_timestamps in timestamps]
+        probabilities = [[None] * len(channel_shards) for channel_shards in shards]
+
+        def get_tasks():
+            for index in sorted(range(len(channels)), key=lambda index: -len(timestamps[index])):
+                messages = list(time_sorted_messages_dicts[index].values())
+
+                for shard, (start, first, stop) in enumerate(shards[index]):
+                    yield index, shard, first - start, MessageTable(messages[start:stop], self._hyperparameters)\
+                        .compact(features, context.vocabulary)
+
+        probability_memo = context.probability_memo
+        memo_size, memo_entries = (probability_memo.max_size, probability_memo.get_entries()) \
+            if probability_memo is not None else (0, None)
+
+        with multiprocessing.Pool(workers,
+                                  initializer=_init_prediction_worker,
+                                  initargs=(dict(self._hyperparameters), features, context.classifier,
+                                            context.vocabulary, memo_size, memo_entries)) as pool:
+            for index, shard, shard_probabilities, new_entries in pool.imap_unordered(_score_shard, get_tasks()):
+                probabilities[index][shard] = shard_probabilities
+
+                if new_entries is not None:
+                    probability_memo.put(*new_entries)
+
+                if any(channel_probabilities is None for channel_probabilities in probabilities[index]):
+                    continue
+
+                pairs = PairSet(*self._get_pair_indices(timestamps[index]))
+                pairs.probabilities = numpy.concatenate(probabilities[index])
+                # Only the merged probabilities are kept
+                probabilities[index] = []
+
+                pred_conversations, _ = self._cluster_messages(pairs, len(timestamps[index]))
+                self._set_conversation_labels(channels[index], time_sorted_messages_dicts[index], pred_conversations)
 
-        :param pairs: The dictionary of message pairs and their probabilities
-        :return: The clusters of the conversations
+    def _score_batch(self, context: Context, batch: [(Channel, Dict[str, Message], PairSet, numpy.ndarray)]):
         """
-        conversations = []
-        best_cluster = None
+        Score the pairs of a batch of channels with a single call of the classifier, then cluster the messages of each
+        channel.
 
-        for message in tqdm.tqdm(messages, desc='Clustering messages'):
-            p = {}
-            try:
-                p = pairs[messages[message].uuid]
-            except KeyError:
-                # print(f"message {message} not in pairs")
-                pass
-            qualities = self._get_qualities_from_clusters(conversations, p)
+        :param context: The context of the request, with its classifier
+        :param batch: The list of the channels, with their time sorted messages, pairs, and feature matrices
+        """
+        pairs, offsets = PairSet.concatenate([channel_pairs for _, _, channel_pairs, _ in batch])
 
-            if len(qualities) > 0:
-                best_cluster = max(qualities, key=lambda x: x[1])
+        if len(pairs):
+            self._predict_max_entropy(numpy.vstack([feature_matrix for _, _, _, feature_matrix in batch]),
+                                      pairs,
+                                      context.classifier,
+                                      context.probability_memo)
 
-            if best_cluster and best_cluster[1] > 0:
-                conversations[best_cluster[0]].messages.append(messages[message])
-                self._pred_conversations.append(best_cluster[0] + 1)
+        for (channel, time_sorted_messages_dict, channel_pairs, _), start, stop in zip(batch,
+                                                                                       offsets[:-1],
+                                                                                       offsets[1:]):
+            channel_pairs.probabilities = pairs.probabilities[start:stop]
 
-                # if is_last:
-                #     messages_modified[message].conversation = f'T{best_cluster[0] + 1}'
+            pred_conversations, _ = self._cluster_messages(channel_pairs, len(time_sorted_messages_dict))
+            self._set_conversation_labels(channel, time_sorted_messages_dict, pred_conversations)
 
-            else:
-                new_convo = Conversation()
-                new_convo.uuid = len(conversations) + 1
-                new_convo.messages.append(messages[message])
+    def _predict_channels_in_batches(self, context: Context, channels: [Channel], features: [Feature]):
+        """
+        Divide the messages of each channel into conversations, scoring the pairs of several channels with a single
+        call of the classifier. The feature matrices of the channels are stacked until they have at least
+        `prediction batch pairs` rows, so that the overhead of each call is shared by many small channels, and the
+        probabilities are then scattered back to the pairs of each channel.
 
-                conversations.append(new_convo)
-                self._pred_conversations.append(new_convo.uuid)
+        :param context: The context of the request, with its classifier and vocabulary
+        :param channels: The channels with at least a message
+        :param features: The list of features types
+        """
+        batch_pairs = int(self._constants['prediction batch pairs'])
+        batch = []
 
-                # if is_last:
-                #     messages_modified[message].conversation = f'T{new_convo.uuid}'
+        for channel in channels:
+            time_sorted_messages_dict = dict(sorted(channel.messages.items(), key=lambda message: message[1].timestamp))
+            table = MessageTable(time_sorted_messages_dict.values(), self._hyperparameters)
+            pairs = self._get_all_pairs(table)
 
-        # return messages_modified if is_last else messages
+            batch.append((channel,
+                          time_sorted_messages_dict,
+                          pairs,
+                          self._extract_all_features(pairs, table, features, context.vocabulary, training=False)))
+
+            if sum(len(channel_pairs) for _, _, channel_pairs, _ in batch) >= batch_pairs:
+                self._score_batch(context, batch)
+                batch = []
+
+        if batch:
+            self._score_batch(context, batch)
+
+    def _stream_channels(self, context: Context, channels: [Channel], features: [Feature]):
+        """
+        Divide the messages of each channel into conversations, streaming them through a Disentangler, so that only
+        the messages of the window and the pairs of a batch are in memory, rather than all the pairs and features of
+        the channel. The conversations are the ones of the greedy clustering.
+
+        :param context: The context of the request, with its classifier and vocabulary
+        :param channels: The channels with at least a message
+        :param features: The list of features types
+        """
+        for channel in channels:
+            disentangler = Disentangler(self,
+                                        features,
+                                        context.classifier,
+                                        context.vocabulary,
+                                        probability_memo=context.probability_memo)
+
+            for _ in disentangler.disentangle(sorted(channel.messages.values(), key=lambda message: message.timestamp)):
+                pass
 
     ####################
     # Helper functions #
@@ -459,43 +842,30 @@ class Model:
         return conversations_dict
 
     @staticmethod
-    def get_unigram_probabilities(community: Community, range_top_words: int = 50):
+    def get_vocabulary(community: Community, range_top_words: int = 50):
         """
-        Given a set of all the community messages, compute the unigram probabilities.
+        Given a set of all the community messages, count their words once, so that the unigram probabilities can be
+        shared by all the channels of the community.
 
         :param community: The community containing all the messages
         :param range_top_words: The number of top words to remove
-        :return: A dictionary of unigram probabilities
+        :return: The vocabulary of the community
         """
-        unigram_probabilities = {}
-        messages = community.get_messages()
-
-        for message in tqdm.tqdm(messages, desc='Computing unigram probabilities'):
-            # message_txt = re.sub(r'[^\w\s]', '', message.processable_text)
-            # message.processable_text = re.sub(r'[^\w\s]', '', message.processable_text)
+        vocabulary = Vocabulary(range_top_words)
+        vocabulary.add_messages(tqdm.tqdm(community.get_messages(), desc='Computing unigram probabilities'))
 
-            for word in message.processable_text.split():
-                # Do not add if it is a removed block (e.g. __MENTION__) or a number or space
-                if re.match(r'_{2}([A-Z]*_?)*_{2}|_|\?', word) or word.isnumeric() or word in ['', ' ']:
-                    continue
-
-                try:
-                    unigram_probabilities[word.lower()] += 1
-                except KeyError:
-                    unigram_probabilities[word.lower()] = 1
-
-        # Remove the top 50 most common unigrams
-        for i in range(range_top_words):
-            maximum = max(unigram_probabilities, key=unigram_probabilities.get)
-            unigram_probabilities.pop(maximum)
+        return vocabulary
 
-        total = sum(unigram_probabilities.values())
-
-        # Normalize the probabilities
-        for word in unigram_probabilities:
-            unigram_probabilities[word] = unigram_probabilities[word] / total
+    @staticmethod
+    def get_unigram_probabilities(community: Community, range_top_words: int = 50):
+        """
+        Given a set of all the community messages, compute the unigram probabilities.
 
-        return unigram_probabilities
+        :param community: The community containing all the messages
+        :param range_top_words: The number of top words to remove
+        :return: A dictionary of unigram probabilities
+        """
+        return dict(Model.get_vocabulary(community, range_top_words))
 
     @staticmethod
     def _get_target_conversation_labels(channel: Channel):
@@ -507,39 +877,59 @@ class Model:
         """
         return [int(message.conversation.replace('T', '')) for message in channel.messages.values()]
 
-    def _set_conversation_labels(self, channel: Channel, time_sorted_messages_dict: Dict[str, Message]):
+    @staticmethod
+    def _set_conversation_labels(channel: Channel,
+                                 time_sorted_messages_dict: Dict[str, Message],
+                                 pred_conversations: [int]):
         """
         Modify the conversation of each message based on the pred_conversation vector.
 
         :param channel: A channel of the community
+        :param time_sorted_messages_dict: The messages of the channel, sorted by timestamp
+        :param pred_conversations: The predicted conversation of each message
         """
         for i, message in enumerate(time_sorted_messages_dict.keys()):
-            channel.messages[message].conversation = f'T{self._pred_conversations[i]}'
+            channel.messages[message].conversation = f'T{pred_conversations[i]}'
 
     ############################################################
     # Main functions for training, validating, and predicting  #
     ############################################################
     @measure_time
-    def train(self, training_set: Community, features: [Feature] = Feature().get_default_features(), group: str = None):
+    def train(self, training_set: Community, features: [Feature] = Feature().get_default_features()):
         """
         Train the model by getting all the possible message pairs, extracting the features from the pairs, feeding the
-        features to the max entropy classifier, and finally feeding the result to the clustering algorithm.
+        features to the max entropy classifier, and finally feeding the result to the clustering algorithm. The trained
+        model is persisted under the key of its training set, features, and hyperparameters.
 
         :param training_set: The training set
         :param features: A list of feature types
-        :param group: The feature group name
         :return: The trained model
         """
+        training_set_hash = self._get_training_set_hash(training_set)
+        cached_vocabulary = self._get_cached_training_vocabulary(training_set_hash)
+        vocabulary = cached_vocabulary if cached_vocabulary is not None else self.get_vocabulary(training_set)
+        trained_model = None
+
         for channel in training_set.channels.values():
             if len(channel.messages) > 0:
-                self._unigram_probabilities = self.get_unigram_probabilities(training_set)
                 time_sorted_messages = sorted(channel.messages.values(), key=lambda message: message.timestamp)
-                pairs = self._get_all_pairs(time_sorted_messages)
+                table = MessageTable(time_sorted_messages, self._hyperparameters)
+                pairs = self._get_all_pairs(table)
+
+                feature_matrix = self._extract_all_features(pairs,
+                                                            table,
+                                                            features,
+                                                            vocabulary)
+                trained_model, _ = self._compute_max_entropy(feature_matrix, pairs.labels)
 
-                feature_matrix, labels = self._extract_all_features(pairs, features, self._unigram_probabilities)
-                self._compute_max_entropy(feature_matrix, labels)
+        key = self._get_model_key(training_set_hash, features)
+        self._save(key, trained_model)
+        self._memoize(key, trained_model)
 
-        self._save(group)
+        if cached_vocabulary is None:
+            self._save_vocabulary(training_set_hash, vocabulary)
+
+        return trained_model
 
     def predict(self,
                 community: Community,
@@ -556,95 +946,125 @@ class Model:
         :param groups: List of groups of features
         :return: The disentangled community
         """
-        try:
-            self._load()
-        except Exception as e:
-            raise Exception(e)
+        context = Context(*self._load_training_set())
 
         times = {}
         labels = None
-        statistics = {}
         predictions = None
 
-        self._pred_conversations = []
+        if self._hyperparameters['vocabulary'] == 'TRAINING':
+            context.vocabulary = self._get_training_vocabulary(context)
+        else:
+            context.vocabulary = self.get_vocabulary(community)
         gold = serialize_community(community)
 
-        for channel in community.channels.values():
-            if len(channel.messages) > 0:
-                time_sorted_messages_dict = dict(sorted(channel.messages.items(),
-                                                        key=lambda message: message[1].timestamp))
-                time_sorted_messages = sorted(channel.messages.values(), key=lambda message: message.timestamp)
+        channels = [channel for channel in community.channels.values() if len(channel.messages) > 0]
+        shard_size = int(self._constants['prediction shard size'])
+        workers = min(self._get_prediction_workers(),
+                      sum((len(channel.messages) - 1) // shard_size + 1 for channel in channels))
+
+        if not validation and workers > 1:
+            self._use_trained_model(context, features)
+            self._predict_channels(context, channels, features, workers)
+        elif not validation and self._constants.getboolean('streaming'):
+            self._use_trained_model(context, features)
+            self._stream_channels(context, channels, features)
+        elif not validation:
+            self._use_trained_model(context, features)
+            self._predict_channels_in_batches(context, channels, features)
+        else:
+            for channel in community.channels.values():
+                if len(channel.messages) > 0:
+                    time_sorted_messages_dict = dict(sorted(channel.messages.items(),
+                                                            key=lambda message: message[1].timestamp))
+                    time_sorted_messages = sorted(channel.messages.values(), key=lambda message: message.timestamp)
 
-                self._unigram_probabilities = self.get_unigram_probabilities(community)
-                pairs = self._get_all_pairs(time_sorted_messages)
+                    table = MessageTable(time_sorted_messages, self._hyperparameters)
+                    pairs = self._get_all_pairs(table)
 
-                if validation:
-                    self._gold_conversations = self._get_target_conversation_labels(channel)
+                    context.gold_conversations = self._get_target_conversation_labels(channel)
 
                     for group in groups:
                         start = time.time()
 
-                        _, train_time = self.train(self._training_set,
-                                                   group.get_group_features(),
-                                                   group=group().__str__().lower())
-                        self._load(group().__str__().lower())
-                        feature_matrix, labels = self._extract_all_features(pairs,
-                                                                            group.get_group_features(),
-                                                                            self._unigram_probabilities)
+                        train_time = self._use_trained_model(context, group.get_group_features())
+                        feature_matrix = self._extract_all_features(pairs,
+                                                                    table,
+                                                                    group.get_group_features(),
+                                                                    context.vocabulary)
+                        labels = pairs.labels
 
-                        (predictions, pairs_and_predictions), max_entropy_time = \
-                            self._predict_max_entropy(feature_matrix, pairs, group=group().__str__().lower())
+                        (predictions, inference_statistics), max_entropy_time = \
+                            self._predict_max_entropy(feature_matrix,
+                                                      pairs,
+                                                      context.classifier,
+                                                      context.probability_memo)
 
-                        _, clustering_time = self._cluster_messages(pairs_and_predictions, time_sorted_messages_dict)
+                        context.pred_conversations, clustering_time = \
+                            self._cluster_messages(pairs, len(time_sorted_messages))
 
                         stop = time.time()
 
                         times = {
                             'train_time': train_time,
                             'max_entropy_time': max_entropy_time,
+                            'unique_pairs_ratio': round(inference_statistics['unique_pairs_ratio'], 3),
+                            'memo_hit_rate': round(inference_statistics['memo_hit_rate'], 3),
+                            'escalated_ratio': round(inference_statistics['escalated_ratio'], 3),
                             'clustering_time': clustering_time,
                             'total_time': round(stop - start, 3),
                         }
 
-                        f_score(statistics, labels, predictions, group().__str__(), times=times)
-                        micro_averaged_f_score_labels(statistics,
-                                                      self._gold_conversations,
-                                                      self._pred_conversations,
+                        f_score(context.statistics, labels, predictions, group().__str__(), times=times)
+                        micro_averaged_f_score_labels(context.statistics,
+                                                      context.gold_conversations,
+                                                      context.pred_conversations,
                                                       group().__str__())
 
-                        self._pred_conversations = []
+                        context.pred_conversations = []
 
-                if (validation and len(groups) > 1) or not validation:
-                    start = time.time()
-
-                    _, train_time = self.train(self._training_set, features)
-                    self._load()
-                    feature_matrix, labels = self._extract_all_features(pairs, features, self._unigram_probabilities)
+                    if len(groups) > 1:
+                        start = time.time()
 
-                    (predictions, pairs_and_predictions), max_entropy_time = self._predict_max_entropy(feature_matrix,
-                                                                                                       pairs)
-                    _, clustering_time = self._cluster_messages(pairs_and_predictions, time_sorted_messages_dict)
-                    # channel.messages = messages
-                    self._set_conversation_labels(channel, time_sorted_messages_dict)
+                        train_time = self._use_trained_model(context, features)
+                        feature_matrix = self._extract_all_features(pairs,
+                                                                    table,
+                                                                    features,
+                                                                    context.vocabulary)
+                        labels = pairs.labels
+
+                        (predictions, inference_statistics), max_entropy_time = \
+                            self._predict_max_entropy(feature_matrix,
+                                                      pairs,
+                                                      context.classifier,
+                                                      context.probability_memo)
+                        context.pred_conversations, clustering_time = self._cluster_messages(pairs,
+                                                                                             len(time_sorted_messages))
+                        # The validated community is saved with the predicted conversations, next to the gold ones
+                        self._set_conversation_labels(channel, time_sorted_messages_dict, context.pred_conversations)
 
-                    stop = time.time()
+                        stop = time.time()
 
-                    times = {
-                        'train_time': train_time,
-                        'max_entropy_time': max_entropy_time,
-                        'clustering_time': clustering_time,
-                        'total_time': round(stop - start, 3),
-                    }
+                        times = {
+                            'train_time': train_time,
+                            'max_entropy_time': max_entropy_time,
+                            'unique_pairs_ratio': round(inference_statistics['unique_pairs_ratio'], 3),
+                            'memo_hit_rate': round(inference_statistics['memo_hit_rate'], 3),
+                            'escalated_ratio': round(inference_statistics['escalated_ratio'], 3),
+                            'clustering_time': clustering_time,
+                            'total_time': round(stop - start, 3),
+                        }
 
-                if validation and len(groups) > 1:
-                    f_score(statistics, labels, predictions, times=times)
-                    micro_averaged_f_score_labels(statistics, self._gold_conversations, self._pred_conversations)
+                        f_score(context.statistics, labels, predictions, times=times)
+                        micro_averaged_f_score_labels(context.statistics,
+                                                      context.gold_conversations,
+                                                      context.pred_conversations)
 
-            self._pred_conversations = []
+                context.pred_conversations = []
 
         if validation:
-            community = community.save_json(1, statistics, gold)
+            community = community.save_json(1, context.statistics, gold)
         else:
-            community = community.save_json(2, statistics)
+            community = community.save_json(2, context.statistics)
 
         return community
@@ -0,0 +1,94 @@
+import numpy
+
+
+class PairSet:
+    """
+    This class represents the candidate pairs of messages of a channel, stored column-wise. The i-th pair relates the
+    message at index left[i] to the (earlier) message at index right[i] of the time sorted messages of the channel.
+    """
+    def __init__(self, left: numpy.ndarray = None, right: numpy.ndarray = None):
+        self._left = numpy.asarray(left if left is not None else [], dtype=numpy.int32)
+        self._right = numpy.asarray(right if right is not None else [], dtype=numpy.int32)
+        self._probabilities = numpy.full(len(self._left), 0.5, dtype=numpy.float32)
+        self._labels = None
+
+    def __len__(self):
+        return len(self._left)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'PairSet: [{len(self)} pairs]'
+
+    @property
+    def left(self):
+        """
+        :type: numpy.ndarray
+        """
+        return self._left
+
+    @property
+    def right(self):
+        """
+        :type: numpy.ndarray
+        """
+        return self._right
+
+    @property
+    def probabilities(self):
+        """
+        :type: numpy.ndarray
+        """
+        return self._probabilities
+
+    @property
+    def labels(self):
+        """
+        :type: numpy.ndarray
+        """
+        return self._labels
+
+    @probabilities.setter
+    def probabilities(self, probabilities: numpy.ndarray):
+        """
+        Set the probabilities that the messages of each pair belong to the same conversation.
+
+        :param probabilities: The probabilities of the pairs
+        """
+        self._probabilities = numpy.asarray(probabilities, dtype=numpy.float32)
+
+    @labels.setter
+    def labels(self, labels: numpy.ndarray):
+        """
+        Set the labels of the pairs, i.e. 1 if the messages of the pair belong to the same conversation, 0 otherwise.
+
+        :param labels: The labels of the pairs
+        """
+        self._labels = numpy.asarray(labels, dtype=numpy.uint8)
+
+    @classmethod
+    def concatenate(cls, pair_sets: ['PairSet']):
+        """
+        Concatenate the pairs of several PairSets, e.g. of different channels, so that they can be scored at once. The
+        pairs of the i-th PairSet are in the range [offsets[i], offsets[i + 1]) of the concatenated PairSet.
+
+        :param pair_sets: The non-empty list of PairSets
+        :return: The concatenated PairSet and the array of the len(pair_sets) + 1 offsets
+        """
+        offsets = numpy.cumsum([0] + [len(pairs) for pairs in pair_sets])
+        concatenated_pairs = cls(numpy.concatenate([pairs.left for pairs in pair_sets]),
+                                 numpy.concatenate([pairs.right for pairs in pair_sets]))
+        concatenated_pairs.probabilities = numpy.concatenate([pairs.probabilities for pairs in pair_sets])
+
+        return concatenated_pairs, offsets
+
+    def get_offsets(self, messages_n: int):
+        """
+        Get the offsets of the pairs of each message. The pairs whose left message is the i-th message are the pairs in
+        the range [offsets[i], offsets[i + 1]). The pairs must be sorted by their left message.
+
+        :param messages_n: The number of messages of the channel
+        :return: The array of the messages_n + 1 offsets
+        """
+        return numpy.searchsorted(self._left, numpy.arange(messages_n + 1), side='left')
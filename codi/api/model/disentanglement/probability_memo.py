@@ -0,0 +1,128 @@
+import threading
+
+from collections import OrderedDict
+
+
+class ProbabilityMemo:
+    """
+    This class represents the memo of the predictions of a trained classifier, keyed by the packed bits of the binary
+    feature vectors. The same combinations of features recur in every channel, so most of the feature vectors can be
+    looked up rather than classified again. The least recently used vectors are evicted when more than `max_size`
+    vectors are memoized. A memo belongs to a single trained classifier, and is shared by the concurrent requests that
+    use it.
+
+    A memo can also record the entries put into it, so that the entries memoized by a prediction worker process can be
+    merged back into the memo of the model.
+    """
+    def __init__(self, max_size: int = 100000, record_new_entries: bool = False):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._new_entries = [] if record_new_entries else None
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'ProbabilityMemo: [{len(self)} feature vectors, {self.hit_rate:.1%} hit rate]'
+
+    @property
+    def max_size(self):
+        """
+        :type: int
+        """
+        return self._max_size
+
+    @property
+    def hits(self):
+        """
+        :type: int
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        :type: int
+        """
+        return self._misses
+
+    @property
+    def hit_rate(self):
+        """
+        :type: float
+        """
+        return self._hits / (self._hits + self._misses) if self._hits + self._misses > 0 else 0.0
+
+    def get_entries(self):
+        """
+        Get all the memoized entries, from the least to the most recently used.
+
+        :return: The packed bits of the feature vectors, their predicted labels, and their probabilities
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+
+        return [key for key, _ in entries], [prediction for _, (prediction, _) in entries], \
+            [probability for _, (_, probability) in entries]
+
+    def pop_new_entries(self):
+        """
+        Get the entries put since the last call, and forget them. The memo must record its new entries.
+
+        :return: The packed bits of the feature vectors, their predicted labels, and their probabilities
+        """
+        with self._lock:
+            new_entries, self._new_entries = self._new_entries, []
+
+        return [key for key, _, _ in new_entries], [prediction for _, prediction, _ in new_entries], \
+            [probability for _, _, probability in new_entries]
+
+    def get(self, keys: [bytes]):
+        """
+        Look up the prediction of each feature vector.
+
+        :param keys: The packed bits of the feature vectors
+        :return: The tuple of the predicted label and of the probability of each feature vector, None if it is not
+                 memoized
+        """
+        values = []
+
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+
+                if value is not None:
+                    self._entries.move_to_end(key)
+
+                values.append(value)
+
+            hits = sum(value is not None for value in values)
+            self._hits += hits
+            self._misses += len(values) - hits
+
+        return values
+
+    def put(self, keys: [bytes], predictions: [int], probabilities: [float]):
+        """
+        Memoize the prediction of each feature vector, evicting the least recently used ones.
+
+        :param keys: The packed bits of the feature vectors
+        :param predictions: The predicted label of each feature vector
+        :param probabilities: The probability of each feature vector
+        """
+        with self._lock:
+            for key, prediction, probability in zip(keys, predictions, probabilities):
+                self._entries[key] = prediction, probability
+                self._entries.move_to_end(key)
+
+                if self._new_entries is not None:
+                    self._new_entries.append((key, prediction, probability))
+
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
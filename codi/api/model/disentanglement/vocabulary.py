@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import os
+import re
+import math
+import heapq
+import numpy
+
+from typing import TYPE_CHECKING
+from collections import Counter
+from collections.abc import Mapping
+
+if TYPE_CHECKING:
+    from ..input.message import Message
+
+
+class Vocabulary(Mapping):
+    """
+    This class represents the unigram probabilities of the words of a community. The words of the messages are counted
+    once, and the probabilities are computed again only after new messages are added, so that the same vocabulary can
+    be shared by all the channels, the feature groups and the validation runs of a community. Each word has an integer
+    id, and each id has the logarithmic bin of its probability, so that the words of the messages can be compared as
+    sorted arrays of ids. It can be used wherever the dictionary of the unigram probabilities is expected.
+    """
+    _removed_blocks = re.compile(r'_{2}([A-Z]*_?)*_{2}|_|\?')
+
+    def __init__(self, range_top_words: int = 50):
+        self._range_top_words = range_top_words
+        self._counts = Counter()
+        self._version = 0
+        self._words = None
+        self._probability_array = None
+        self._stop_words = None
+        self._probabilities = None
+        self._ids = None
+        self._bins = {}
+
+    def __getitem__(self, word: str):
+        return self.probabilities[word]
+
+    def __iter__(self):
+        return iter(self.probabilities)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.ids
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return f'Vocabulary: [{len(self)} words]'
+
+    @property
+    def range_top_words(self):
+        """
+        :type: int
+        """
+        return self._range_top_words
+
+    @property
+    def counts(self):
+        """
+        :type: Counter
+        """
+        return self._counts
+
+    @property
+    def version(self):
+        """
+        :type: int
+        """
+        return self._version
+
+    @property
+    def words(self):
+        """
+        :type: [str]
+        """
+        if self._words is None:
+            self._count()
+        return self._words
+
+    @property
+    def probability_array(self):
+        """
+        :type: numpy.ndarray
+        """
+        if self._probability_array is None:
+            self._count()
+        return self._probability_array
+
+    @property
+    def stop_words(self):
+        """
+        :type: [str]
+        """
+        if self._stop_words is None:
+            self._count()
+        return self._stop_words
+
+    @property
+    def probabilities(self):
+        """
+        :type: {str: float}
+        """
+        if self._probabilities is None:
+            self._probabilities = dict(zip(self.words, self.probability_array.tolist()))
+        return self._probabilities
+
+    @property
+    def ids(self):
+        """
+        :type: {str: int}
+        """
+        if self._ids is None:
+            self._ids = {word: i for i, word in enumerate(self.words)}
+        return self._ids
+
+    @classmethod
+    def from_probabilities(cls, probabilities: {str: float}):
+        """
+        Create a vocabulary with the given unigram probabilities, instead of counting the words of the messages.
+
+        :param probabilities: The unigram probabilities
+        :return: The vocabulary
+        """
+        vocabulary = cls(0)
+        vocabulary._words = list(probabilities)
+        vocabulary._probability_array = numpy.fromiter(probabilities.values(), dtype=numpy.float64,
+                                                       count=len(probabilities))
+        vocabulary._stop_words = []
+
+        return vocabulary
+
+    def _count(self):
+        """
+        Compute the unigram probabilities from the word counts, after removing the most common words.
+        """
+        # The most common words are removed in the same order as successive max() calls, i.e. ties are broken by the
+        # order in which the words have been seen first
+        self._stop_words = [word for word, _ in heapq.nlargest(self._range_top_words,
+                                                               self._counts.items(),
+                                                               key=lambda item: item[1])]
+        stop_words = set(self._stop_words)
+        counts = {word: count for word, count in self._counts.items() if word not in stop_words}
+        total = sum(counts.values())
+
+        self._words = list(counts)
+        self._probability_array = numpy.fromiter((count / total for count in counts.values()), dtype=numpy.float64,
+                                                 count=len(counts))
+
+    @staticmethod
+    def get_unigrams(text: str):
+        """
+        Get the unigrams of a text that are counted by the vocabulary, i.e. its words except for the removed blocks
+        (e.g. __MENTION__) and the numbers.
+
+        :param text: The processable text of a message
+        :return: The list of the lowercase unigrams
+        """
+        # Removed blocks are the words starting with an underscore or a question mark
+        return [word.lower() for word in text.split() if word[0] not in '_?' and not word.isnumeric()]
+
+    def add_messages(self, messages: [Message]):
+        """
+        Count the words of the given messages, e.g. of the messages appended to the community.
+
+        :param messages: The messages
+        """
+        for message in messages:
+            self._counts.update(self.get_unigrams(message.processable_text))
+
+        self._version += 1
+        self._words = None
+        self._probability_array = None
+        self._stop_words = None
+        self._probabilities = None
+        self._ids = None
+        self._bins = {}
+
+    @classmethod
+    def get_words(cls, text: str):
+        """
+        Get the set of words of a text, without the removed blocks (e.g. __MENTION__).
+
+        :param text: The processable text of a message
+        :return: The set of words of the text
+        """
+        return set(cls._removed_blocks.sub(' ', text).lower().split())
+
+    @staticmethod
+    def get_bin(probability: float, bin_size: int):
+        """
+        Bin logarithmically the probability of a word. The words rarer than the last bin fall into the last bin.
+
+        :param probability: The unigram probability of the word
+        :param bin_size: The number of bins
+        :return: The index of the bin
+        """
+        return min(-int(math.log(probability, 10)), bin_size - 1) if probability > 0 else 0
+
+    def get_bins(self, bin_size: int):
+        """
+        Get the logarithmic bin of the probability of each word, indexed by the id of the word.
+
+        :param bin_size: The number of bins
+        :return: The array of the bins
+        """
+        if bin_size not in self._bins:
+            self._bins[bin_size] = numpy.fromiter((self.get_bin(probability, bin_size)
+                                                   for probability in self.probability_array.tolist()),
+                                                  dtype=numpy.int64,
+                                                  count=len(self))
+        return self._bins[bin_size]
+
+    def get_ids(self, text: str):
+        """
+        Get the ids of the words of a text that are in the vocabulary.
+
+        :param text: The processable text of a message
+        :return: The sorted array of the ids
+        """
+        word_ids = self.ids
+
+        return numpy.sort(numpy.array([word_ids[word] for word in self.get_words(text) if word in word_ids],
+                                      dtype=numpy.int64))
+
+    def save(self, path: str):
+        """
+        Save the words, the stop words, the probabilities and the computed bins of the vocabulary into a directory,
+        one .npy file each. The words are stored as their newline separated UTF-8 bytes, since no word contains a
+        whitespace.
+
+        :param path: The path of the directory
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        numpy.save(os.path.join(path, 'words.npy'), numpy.frombuffer('\n'.join(self.words).encode('utf-8'),
+                                                                     dtype=numpy.uint8))
+        numpy.save(os.path.join(path, 'stop-words.npy'), numpy.frombuffer('\n'.join(self.stop_words).encode('utf-8'),
+                                                                          dtype=numpy.uint8))
+        numpy.save(os.path.join(path, 'probabilities.npy'), self.probability_array)
+
+        for bin_size, bins in self._bins.items():
+            numpy.save(os.path.join(path, f'bins-{bin_size}.npy'), bins)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a vocabulary saved with `save()`. The probabilities and the bins are memory-mapped rather than read, and
+        the vocabulary cannot be updated with new messages.
+
+        :param path: The path of the directory
+        :return: The vocabulary, or None if it has never been saved
+        """
+        def load_words(name):
+            text = numpy.load(os.path.join(path, name)).tobytes().decode('utf-8')
+            return text.split('\n') if text else []
+
+        try:
+            vocabulary = cls(0)
+            vocabulary._words = load_words('words.npy')
+            vocabulary._stop_words = load_words('stop-words.npy')
+            vocabulary._probability_array = numpy.load(os.path.join(path, 'probabilities.npy'), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+
+        for name in os.listdir(path):
+            if name.startswith('bins-'):
+                vocabulary._bins[int(name[len('bins-'):-len('.npy')])] = numpy.load(os.path.join(path, name),
+                                                                                    mmap_mode='r')
+
+        return vocabulary
@@ -1,10 +1,15 @@
+import os
 import json
 
 from unittest import TestCase
+from sklearn.ensemble import RandomForestClassifier
 
 from codi.api.model.input.member import Member
 from codi.api.model.input.message import Message
 from codi.api.model.input.community import Community
+from codi.api.model.disentanglement.model import Model
+from codi.api.model.disentanglement.feature import Feature
+from codi.api.model.disentanglement.message_table import MessageTable
 
 
 class Framework(TestCase):
@@ -23,6 +28,48 @@ class Framework(TestCase):
         """
         return Community().deserialize(data)
 
+    @classmethod
+    def _get_test_data(cls, limit: int = None):
+        """
+        Get the data of the test set of the previous papers, as a Discord community.
+
+        :param limit: The maximum number of messages of each channel, all the messages if None
+        :return: The data of the community
+        """
+        data = cls._read_data_from_fixtures(os.path.join(os.path.dirname(__file__),
+                                                         '../../../datasets/json/from_previous_papers/test.json'))
+        data['platform'] = 'discord'
+
+        if limit is not None:
+            for channel in data['channels']:
+                channel['messages'] = channel['messages'][:limit]
+
+        return data
+
+    @classmethod
+    def _get_scored_channel(cls, limit: int = 200, n_estimators: int = 20):
+        """
+        Get the first channel of the test set, with the feature matrix of its pairs and a seeded random forest trained
+        on them. The probabilities of the pairs are the ones of the forest.
+
+        :param limit: The maximum number of messages of the channel
+        :param n_estimators: The number of trees of the forest
+        :return: The model, the time sorted messages, the vocabulary, the PairSet, the feature matrix, and the forest
+        """
+        community = cls._get_community_object(cls._get_test_data(limit))
+        messages = sorted(list(community.channels.values())[0].messages.values(), key=lambda message: message.timestamp)
+
+        model = Model()
+        vocabulary = model.get_vocabulary(community)
+        table = MessageTable(messages, model._hyperparameters)
+        pairs = model._get_all_pairs(table)
+        feature_matrix = model._extract_all_features(pairs, table, Feature.get_default_features(), vocabulary)
+
+        classifier = RandomForestClassifier(n_estimators=n_estimators, random_state=0).fit(feature_matrix, pairs.labels)
+        pairs.probabilities = classifier.predict_proba(feature_matrix)[:, 1]
+
+        return model, messages, vocabulary, pairs, feature_matrix, classifier
+
     @staticmethod
     def _get_community_members_and_messages(data: dict):
         """
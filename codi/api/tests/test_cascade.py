@@ -0,0 +1,60 @@
+import numpy
+
+from sklearn.linear_model import LogisticRegression
+
+from codi.api.tests.framework import Framework
+from codi.api.model.disentanglement.forest import CompiledForest
+from codi.api.model.disentanglement.cascade import Cascade
+
+
+class TestCascade(Framework):
+    def setUp(self):
+        self._model, _, _, self._pairs, self._feature_matrix, self._forest = self._get_scored_channel()
+        self._screen = LogisticRegression(random_state=0, max_iter=1000).fit(self._feature_matrix, self._pairs.labels)
+        self._cascade = Cascade(self._screen, self._forest)
+
+    def test_whole_band_is_the_forest(self):
+        probabilities, escalated = self._cascade.predict_proba(self._feature_matrix, 0, 1)
+
+        self.assertTrue(escalated.all())
+        self.assertTrue(numpy.array_equal(probabilities, self._forest.predict_proba(self._feature_matrix)))
+
+    def test_empty_band_is_the_screen(self):
+        probabilities, escalated = self._cascade.predict_proba(self._feature_matrix, 1, 0)
+
+        self.assertFalse(escalated.any())
+        self.assertTrue(numpy.array_equal(probabilities, self._screen.predict_proba(self._feature_matrix)))
+
+    def test_only_uncertain_pairs_are_escalated(self):
+        screen_probabilities = self._screen.predict_proba(self._feature_matrix)[:, 1]
+        forest_probabilities = self._forest.predict_proba(self._feature_matrix)[:, 1]
+        probabilities, escalated = self._cascade.predict_proba(self._feature_matrix, .1, .9)
+
+        self.assertTrue(numpy.array_equal(escalated, (screen_probabilities >= .1) & (screen_probabilities <= .9)))
+        self.assertTrue(numpy.array_equal(probabilities[:, 1],
+                                          numpy.where(escalated, forest_probabilities, screen_probabilities)))
+
+    def test_escalated_ratio(self):
+        self._model._hyperparameters['classifier'] = 'CASCADE'
+        self._model._hyperparameters['cascade lower bound'] = '0.1'
+        self._model._hyperparameters['cascade upper bound'] = '0.9'
+        keys, indices, _ = self._model._get_unique_rows(self._feature_matrix)
+        _, escalated = self._cascade.predict_proba(self._feature_matrix[indices], .1, .9)
+
+        (_, statistics), _ = self._model._predict_max_entropy(self._feature_matrix, self._pairs, self._cascade)
+
+        self.assertEqual(statistics['escalated_ratio'], escalated.sum() / len(keys))
+
+    def test_compiled_forest(self):
+        self._model._hyperparameters['classifier'] = 'CASCADE'
+        self._model._constants['compile forest'] = 'yes'
+        self._model._memoize('key', self._cascade)
+        cascade, _ = self._model._trained_models['key']
+
+        self.assertIsInstance(cascade.forest, CompiledForest)
+
+        self._model._predict_max_entropy(self._feature_matrix, self._pairs, self._cascade)
+        probabilities = self._pairs.probabilities
+        self._model._predict_max_entropy(self._feature_matrix, self._pairs, cascade)
+
+        self.assertTrue(numpy.array_equal(self._pairs.probabilities, probabilities))
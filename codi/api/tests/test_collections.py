@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from codi.api.collections import Lexicon, get_lexicon, reload_lexicons
+
+
+class TestLexicon(TestCase):
+    def test_lexicon_is_loaded_once(self):
+        self.assertIs(get_lexicon('question_words'), get_lexicon('question_words'))
+
+    def test_lexicon_words(self):
+        lexicon = get_lexicon('question_words')
+
+        self.assertEqual(lexicon.words, ('what', 'when', 'who', 'why', 'which', 'how', 'whose'))
+        self.assertIsInstance(lexicon.word_set, frozenset)
+        self.assertIn('why', lexicon)
+        self.assertNotIn('because', lexicon)
+
+    def test_reload_lexicon(self):
+        lexicon = get_lexicon('cue_words_thanks')
+        reload_lexicons('cue_words_thanks')
+
+        self.assertIsNot(get_lexicon('cue_words_thanks'), lexicon)
+        self.assertEqual(get_lexicon('cue_words_thanks').words, lexicon.words)
+
+    def test_search_whole_words_and_phrases(self):
+        lexicon = Lexicon('test', ['got it', 'ok'])
+
+        self.assertTrue(lexicon.search('i got it, thanks'))
+        self.assertTrue(lexicon.search('ok'))
+        self.assertFalse(lexicon.search('i gotit'))
+        self.assertFalse(lexicon.search('okay'))
+
+    def test_match_at_the_start(self):
+        lexicon = get_lexicon('question_words')
+
+        self.assertTrue(lexicon.match('how do i install it'))
+        self.assertFalse(lexicon.match('i know how'))
+        self.assertFalse(lexicon.match('however'))
+
+    def test_empty_lexicon_matches_nothing(self):
+        self.assertFalse(Lexicon('empty', []).search('anything'))
@@ -0,0 +1,52 @@
+import numpy
+
+from codi.api.tests.framework import Framework
+from codi.api.model.disentanglement.clustering import Clustering
+from codi.api.model.disentanglement.disentangler import Disentangler
+
+
+class TestDisentangler(Framework):
+    def setUp(self):
+        self._model, self._messages, self._vocabulary, self._pairs, _, self._classifier = \
+            self._get_scored_channel(n_estimators=10)
+
+    def test_same_conversations_as_whole_channel(self):
+        disentangler = Disentangler(self._model, classifier=self._classifier, vocabulary=self._vocabulary)
+
+        conversations = [disentangler.push(message) for message in self._messages]
+
+        self.assertEqual(conversations, [f'T{label + 1}'
+                                         for label in Clustering().cluster(self._pairs, len(self._messages))])
+
+    def test_history_is_bounded_by_the_window(self):
+        disentangler = Disentangler(self._model, classifier=self._classifier, vocabulary=self._vocabulary)
+        max_pairs_n = numpy.diff(self._pairs.get_offsets(len(self._messages))).max()
+
+        for message in self._messages:
+            disentangler.push(message)
+
+            self.assertLessEqual(len(disentangler.history), max_pairs_n + 1)
+            self.assertLessEqual(len(disentangler.clustering.labels), max_pairs_n + 1)
+
+        self.assertEqual(len(disentangler), len(self._messages))
+
+    def test_messages_must_be_in_timestamp_order(self):
+        disentangler = Disentangler(self._model, classifier=self._classifier, vocabulary=self._vocabulary)
+        disentangler.push(self._messages[-1])
+
+        with self.assertRaises(Exception):
+            disentangler.push(self._messages[0])
+
+    def test_stream_in_batches(self):
+        disentangler = Disentangler(self._model, classifier=self._classifier, vocabulary=self._vocabulary, max_pairs=50)
+        max_pairs_n = numpy.diff(self._pairs.get_offsets(len(self._messages))).max()
+        conversations = []
+
+        for conversation in disentangler.disentangle(iter(self._messages)):
+            conversations.append(conversation)
+
+            # The history holds the window of the last assigned message and the batch being assigned
+            self.assertLessEqual(len(disentangler.history), max_pairs_n + disentangler.max_pairs + 2)
+
+        self.assertEqual(conversations, [f'T{label + 1}'
+                                         for label in Clustering().cluster(self._pairs, len(self._messages))])
@@ -0,0 +1,72 @@
+import os
+import sys
+import numpy
+import pickle
+import subprocess
+
+from sklearn.ensemble import RandomForestClassifier
+
+from codi.api.tests.framework import Framework
+from codi.api.model.disentanglement.forest import CompiledForest
+
+
+class TestCompiledForest(Framework):
+    def setUp(self):
+        self._model, _, _, self._pairs, self._feature_matrix, self._classifier = self._get_scored_channel()
+        self._labels = self._pairs.labels
+
+    def test_same_probabilities_as_the_forest(self):
+        forest = CompiledForest.compile(self._classifier, max_rows=100)
+
+        self.assertEqual(len(forest), 20)
+        self.assertEqual(forest.classes_.tolist(), self._classifier.classes_.tolist())
+        self.assertTrue(numpy.array_equal(forest.predict_proba(self._feature_matrix),
+                                          self._classifier.predict_proba(self._feature_matrix)))
+
+    def test_packed_rows(self):
+        forest = CompiledForest.compile(self._classifier)
+        packed_matrix = numpy.packbits(self._feature_matrix != 0, axis=1)
+
+        self.assertTrue(numpy.array_equal(forest.predict_packed_proba(packed_matrix),
+                                          self._classifier.predict_proba(self._feature_matrix)))
+
+    def test_rows_that_are_not_binary(self):
+        # The splits of a forest trained on values greater than 1 are skipped by the binary rows
+        feature_matrix = self._feature_matrix * numpy.random.default_rng(0).integers(1, 4, self._feature_matrix.shape)
+        classifier = RandomForestClassifier(n_estimators=20, random_state=0).fit(feature_matrix, self._labels)
+        forest = CompiledForest.compile(classifier)
+
+        self.assertTrue(numpy.array_equal(forest.predict_proba(feature_matrix),
+                                          classifier.predict_proba(feature_matrix)))
+        self.assertTrue(numpy.array_equal(forest.predict_proba(self._feature_matrix),
+                                          classifier.predict_proba(self._feature_matrix)))
+
+    def test_pickled_forest(self):
+        forest = pickle.loads(pickle.dumps(CompiledForest.compile(self._classifier)))
+
+        self.assertTrue(numpy.array_equal(forest.predict_proba(self._feature_matrix),
+                                          self._classifier.predict_proba(self._feature_matrix)))
+
+    def test_memoized_forest_is_compiled(self):
+        self._model._constants['compile forest'] = 'yes'
+        self._model._memoize('key', self._classifier)
+        forest, _ = self._model._trained_models['key']
+
+        self.assertIsInstance(forest, CompiledForest)
+
+        self._model._predict_max_entropy(self._feature_matrix, self._pairs, self._classifier)
+        probabilities = self._pairs.probabilities
+        self._model._predict_max_entropy(self._feature_matrix, self._pairs, forest)
+
+        self.assertTrue(numpy.array_equal(self._pairs.probabilities, probabilities))
+
+    def test_model_is_loaded_without_scikit_learn(self):
+        # The prediction workers only import the model module, so they run without scikit-learn or imbalanced-learn
+        modules = subprocess.run([sys.executable, '-c', 'import sys; import codi.api.model.disentanglement.model; '
+                                                        'print(*sorted(sys.modules))'],
+                                 cwd=os.path.join(os.path.dirname(__file__), '../../..'),
+                                 capture_output=True,
+                                 text=True,
+                                 check=True).stdout.split()
+
+        self.assertFalse([module for module in modules if module.split('.')[0] in ['sklearn', 'imblearn']])
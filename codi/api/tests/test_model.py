@@ -1,7 +1,23 @@
 import os
+import numpy
+import pickle
+import tempfile
+import threading
+
+from unittest import mock
+from sklearn.ensemble import RandomForestClassifier
 
 from codi.api.tests.framework import Framework
+from codi.api.model.disentanglement.chat import Chat
+from codi.api.model.disentanglement.discourse import CueWords, Question
 from codi.api.model.disentanglement.model import Model
+from codi.api.model.disentanglement.context import Context
+from codi.api.model.disentanglement.feature import Feature
+from codi.api.model.disentanglement.pair_set import PairSet
+from codi.api.model.disentanglement.clustering import Clustering, VectorizedClustering, UnionFindClustering
+from codi.api.model.disentanglement.vocabulary import Vocabulary
+from codi.api.model.disentanglement.probability_memo import ProbabilityMemo
+from codi.api.model.disentanglement.message_table import MessageTable
 
 
 class TestModel(Framework):
@@ -27,10 +43,10 @@ class TestPairs(TestModel):
         model._hyperparameters["max window size"] = '129'
         model._hyperparameters["previous n messages to check"] = '4'
 
-        pairs = model._get_all_pairs(messages)
+        pairs = model._get_all_pairs(MessageTable(messages, model._hyperparameters))
 
-        for pair in pairs:
-            pairs_of_ids.append((pair.message1.uuid, pair.message2.uuid))
+        for i, j in zip(pairs.left, pairs.right):
+            pairs_of_ids.append((messages[i].uuid, messages[j].uuid))
 
         swapped_pairs = []
         expected_pairs = [('2', '1'),
@@ -52,3 +68,482 @@ class TestPairs(TestModel):
         bool_swapped = set(pairs_of_ids) == set(swapped_pairs)
 
         self.assertTrue(bool_pairs or bool_swapped)
+
+
+class TestModelKey(TestModel):
+    def setUp(self, path: str = None):
+        super().setUp('./community_for_pair_extraction.json')
+
+    def test_same_key_for_same_training_set(self):
+        model = Model()
+        other_community = self._get_community_object(self._read_data_from_fixtures(
+            os.path.join(os.path.dirname(__file__), './fixture_data/community_for_pair_extraction.json')))
+
+        self.assertEqual(model._get_model_key(model._get_training_set_hash(self._community),
+                                              Feature.get_default_features()),
+                         model._get_model_key(model._get_training_set_hash(other_community),
+                                              Feature.get_default_features()))
+
+    def test_different_key_for_different_features(self):
+        model = Model()
+        training_set_hash = model._get_training_set_hash(self._community)
+
+        self.assertNotEqual(model._get_model_key(training_set_hash, Feature.get_default_features()),
+                            model._get_model_key(training_set_hash, Chat.get_group_features()))
+
+    def test_different_key_for_different_hyperparameters(self):
+        model = Model()
+        training_set_hash = model._get_training_set_hash(self._community)
+        key = model._get_model_key(training_set_hash, Feature.get_default_features())
+
+        model._hyperparameters['max window size'] = '129'
+
+        self.assertNotEqual(key, model._get_model_key(training_set_hash, Feature.get_default_features()))
+
+    def test_concurrent_requests_use_their_own_model(self):
+        model = Model()
+        contexts = [Context(self._community, f'{i:016x}') for i in range(8)]
+
+        for i, context in enumerate(contexts):
+            model._memoize(model._get_model_key(context.training_set_hash, Feature.get_default_features()), i)
+
+        threads = [threading.Thread(target=model._use_trained_model, args=(context, Feature.get_default_features()))
+                   for context in contexts]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([context.classifier for context in contexts], list(range(8)))
+
+
+class TestPairIndices(TestModel):
+    def setUp(self, path: str = None):
+        super().setUp('./community_for_pair_extraction.json')
+
+    def test_pairs_in_window_and_previous_n(self):
+        model = Model()
+        model._hyperparameters["max window size"] = '10'
+        model._hyperparameters["previous n messages to check"] = '1'
+
+        first, second = model._get_pair_indices(numpy.array([0, 5, 10, 30, 31, 32], dtype=numpy.int64))
+
+        self.assertEqual(list(zip(first.tolist(), second.tolist())),
+                         [(1, 0), (2, 1), (3, 2), (4, 3), (5, 3), (5, 4)])
+
+    def test_no_pairs_for_single_message(self):
+        first, second = Model()._get_pair_indices(numpy.array([42], dtype=numpy.int64))
+
+        self.assertEqual(len(first), 0)
+        self.assertEqual(len(second), 0)
+
+
+class TestClustering(TestModel):
+    def setUp(self, path: str = None):
+        super().setUp('./community_for_pair_extraction.json')
+
+    def test_cluster_messages(self):
+        model = Model()
+        pairs = PairSet(numpy.array([1, 2, 2, 3, 3, 3]), numpy.array([0, 0, 1, 0, 1, 2]))
+        pairs.probabilities = numpy.array([0.9, 0.2, 0.3, 0.7, 0.1, 0.6])
+
+        pred_conversations, _ = model._cluster_messages(pairs, 4)
+
+        self.assertEqual(pred_conversations, [1, 1, 2, 2])
+
+    def test_pair_offsets(self):
+        pairs = PairSet(numpy.array([1, 2, 2, 4]), numpy.array([0, 0, 1, 3]))
+
+        self.assertEqual(pairs.get_offsets(5).tolist(), [0, 0, 1, 3, 3, 4])
+
+    def test_ties_go_to_the_first_conversation(self):
+        clustering = Clustering()
+
+        for antecedents, probabilities in [([], []), ([0], [0.2]), ([0, 1], [0.75, 0.75]), ([1, 2], [0.9, 0.2])]:
+            clustering.add_message(antecedents, probabilities)
+
+        self.assertEqual(clustering.labels, [0, 1, 0, 1])
+        self.assertEqual(clustering.conversations, [[0, 2], [1, 3]])
+
+    def test_inactive_conversations_are_closed(self):
+        clustering = Clustering()
+
+        for antecedents, probabilities in [([], []), ([0], [0.2]), ([0, 1], [0.1, 0.9]), ([2], [0.8]), ([3], [0.3])]:
+            clustering.add_message(antecedents, probabilities)
+
+        self.assertEqual(clustering.labels, [0, 1, 1, 1, 2])
+        self.assertEqual(list(clustering.active_conversations), [1, 2])
+        self.assertEqual(clustering.pop_closed_conversations(), {0: [0]})
+        self.assertEqual(clustering.closed_conversations, {})
+
+    def test_union_find_links_the_most_probable_pairs(self):
+        pairs = PairSet(numpy.array([1, 2, 2, 3, 3, 3]), numpy.array([0, 0, 1, 0, 1, 2]))
+        pairs.probabilities = numpy.array([0.9, 0.2, 0.3, 0.7, 0.8, 0.6])
+
+        self.assertEqual(UnionFindClustering(0.5).cluster(pairs, 4), [0, 0, 1, 0])
+        self.assertEqual(UnionFindClustering(0.5, best_link=False).cluster(pairs, 4), [0, 0, 0, 0])
+
+
+class TestVectorizedClustering(TestModel):
+    def setUp(self, path: str = None):
+        self._community = self._get_community_object(self._get_test_data())
+
+    def _assert_same_as_greedy_clustering(self, get_probabilities):
+        model = Model()
+
+        for channel in self._community.channels.values():
+            messages = sorted(channel.messages.values(), key=lambda message: message.timestamp)
+            pairs = model._get_all_pairs(MessageTable(messages, model._hyperparameters))
+            pairs.probabilities = get_probabilities(numpy.random.default_rng(0), len(pairs))
+
+            self.assertEqual(VectorizedClustering().cluster(pairs, len(messages)),
+                             Clustering().cluster(pairs, len(messages)))
+
+    def test_same_as_greedy_clustering_for_uniform_probabilities(self):
+        self._assert_same_as_greedy_clustering(lambda rng, n: rng.random(n))
+
+    def test_same_as_greedy_clustering_for_skewed_probabilities(self):
+        self._assert_same_as_greedy_clustering(lambda rng, n: rng.beta(0.3, 1.5, n))
+
+    def test_same_as_greedy_clustering_for_tied_probabilities(self):
+        self._assert_same_as_greedy_clustering(lambda rng, n: rng.integers(0, 5, n) / 4)
+
+
+class TestFeatureMatrix(TestModel):
+    def setUp(self, path: str = None):
+        pass
+
+    def _assert_same_as_flattened_features(self, path: str):
+        super().setUp(path)
+
+        model = Model()
+        messages = sorted(self._messages.values(), key=lambda message: message.timestamp)
+        unigram_probabilities = model.get_unigram_probabilities(self._community, 0)
+        table = MessageTable(messages, model._hyperparameters)
+        pairs = model._get_all_pairs(table)
+
+        flattened_matrix = model._flatten_features([Feature.get_features(messages[i],
+                                                                         messages[j],
+                                                                         Feature.get_default_features(),
+                                                                         model._hyperparameters,
+                                                                         unigram_probabilities)
+                                                    for i, j in zip(pairs.left, pairs.right)])
+        feature_matrix = model._extract_all_features(pairs,
+                                                     table,
+                                                     Feature.get_default_features(),
+                                                     unigram_probabilities)
+
+        self.assertEqual(feature_matrix.tolist(), flattened_matrix)
+
+    def test_same_as_flattened_features_for_pairs(self):
+        self._assert_same_as_flattened_features('./community_for_pair_extraction.json')
+
+    def test_same_as_flattened_features_for_mentions(self):
+        self._assert_same_as_flattened_features('./community_for_mention_feature_extraction.json')
+
+    def test_same_as_flattened_features_for_cue_words(self):
+        self._assert_same_as_flattened_features('./community_for_cue_words_feature_extraction.json')
+
+    def test_same_as_flattened_features_for_repeat(self):
+        self._assert_same_as_flattened_features('./community_for_repeat_feature_extraction.json')
+
+
+class TestMessageTable(TestModel):
+    def setUp(self, path: str = None):
+        super().setUp('./community_for_cue_words_feature_extraction.json')
+
+    def test_values_are_computed_once(self):
+        table = MessageTable(list(self._messages.values()), Model()._hyperparameters)
+
+        self.assertIs(table.get_values(CueWords), table.get_values(CueWords))
+
+    def test_matrix_has_the_values_of_each_message(self):
+        messages = list(self._messages.values())
+        table = MessageTable(messages, Model()._hyperparameters)
+
+        self.assertEqual(table.get_matrix([CueWords, Question]).tolist(),
+                         [CueWords.extract_message(message) + Question.extract_message(message)
+                          for message in messages])
+
+    def test_sliding_window(self):
+        messages = sorted(self._messages.values(), key=lambda message: message.timestamp)
+        vocabulary = Model.get_vocabulary(self._community, 0)
+        table = MessageTable(messages[:2], Model()._hyperparameters)
+
+        # Compute the properties before sliding the window, so that they are updated rather than computed again
+        table.get_values(CueWords)
+        table.get_word_ids(vocabulary)
+        self.assertEqual(len(table.timestamps) + len(table.author_ids) + len(table.mentions), 6)
+
+        for message in messages[2:]:
+            table.append(message)
+        table.drop(1)
+
+        expected_table = MessageTable(messages[1:], Model()._hyperparameters)
+
+        self.assertEqual(table.get_values(CueWords).tolist(), expected_table.get_values(CueWords).tolist())
+        self.assertEqual([array.tolist() for array in table.get_word_ids(vocabulary)],
+                         [array.tolist() for array in expected_table.get_word_ids(vocabulary)])
+        self.assertEqual(table.timestamps.tolist(), expected_table.timestamps.tolist())
+        self.assertEqual(table.mentions, expected_table.mentions)
+
+    def test_compact_table_has_the_same_features(self):
+        model = Model()
+        messages = sorted(self._messages.values(), key=lambda message: message.timestamp)
+        vocabulary = model.get_vocabulary(self._community, 0)
+        table = MessageTable(messages, model._hyperparameters)
+        pairs = model._get_all_pairs(table)
+
+        compact_table = pickle.loads(pickle.dumps(table.compact(Feature.get_default_features(), vocabulary)))
+
+        self.assertIsNone(compact_table.messages)
+        self.assertEqual(len(compact_table), len(messages))
+        self.assertEqual(model._extract_all_features(pairs,
+                                                     compact_table,
+                                                     Feature.get_default_features(),
+                                                     pickle.loads(pickle.dumps(vocabulary)),
+                                                     training=False).tolist(),
+                         model._extract_all_features(pairs, table, Feature.get_default_features(), vocabulary).tolist())
+
+
+class TestVocabulary(TestModel):
+    def setUp(self, path: str = None):
+        super().setUp('./community_for_repeat_feature_extraction.json')
+
+    def test_word_ids_of_each_message(self):
+        messages = sorted(self._messages.values(), key=lambda message: message.timestamp)
+        vocabulary = Model.get_vocabulary(self._community, 0)
+        offsets, word_ids = MessageTable(messages, Model()._hyperparameters).get_word_ids(vocabulary)
+
+        for i, message in enumerate(messages):
+            words = Vocabulary.get_words(message.processable_text) & vocabulary.keys()
+
+            self.assertEqual(word_ids[offsets[i]:offsets[i + 1]].tolist(),
+                             sorted(vocabulary.ids[word] for word in words))
+
+    def test_rare_words_fall_into_the_last_bin(self):
+        vocabulary = Vocabulary.from_probabilities({'common': 0.5, 'rare': 0.0005, 'rarest': 1e-9})
+
+        self.assertEqual(vocabulary.get_bins(5).tolist(), [0, 3, 4])
+
+    def test_messages_added_incrementally(self):
+        messages = self._community.get_messages()
+        vocabulary = Vocabulary(5)
+        vocabulary.add_messages(messages[:len(messages) // 2])
+        table = MessageTable(messages, Model()._hyperparameters)
+        word_ids = table.get_word_ids(vocabulary)
+        vocabulary.add_messages(messages[len(messages) // 2:])
+
+        self.assertEqual(dict(vocabulary), Model.get_unigram_probabilities(self._community, 5))
+        self.assertIsNot(table.get_word_ids(vocabulary), word_ids)
+
+    def test_saved_and_loaded(self):
+        vocabulary = Model.get_vocabulary(self._community, 5)
+        vocabulary.get_bins(5)
+
+        with tempfile.TemporaryDirectory() as path:
+            vocabulary.save(path)
+            loaded_vocabulary = Vocabulary.load(path)
+
+            self.assertEqual(dict(loaded_vocabulary), dict(vocabulary))
+            self.assertEqual(loaded_vocabulary.stop_words, vocabulary.stop_words)
+            self.assertIsInstance(loaded_vocabulary.get_bins(5), numpy.memmap)
+            self.assertEqual(loaded_vocabulary.get_bins(5).tolist(), vocabulary.get_bins(5).tolist())
+
+
+class TestChannelsPrediction(TestModel):
+    def setUp(self, path: str = None):
+        data = self._get_test_data()
+
+        # Split the channel into channels of different lengths
+        messages = data['channels'][0]['messages']
+        data['channels'] = [{**data['channels'][0], 'id': str(i), 'messages': messages[start:stop]}
+                            for i, (start, stop) in enumerate([(0, 100), (100, 400), (400, 450), (450, 600)])]
+
+        self._community = self._get_community_object(data)
+        self._model = Model()
+
+        self._context = Context()
+        self._context.vocabulary = self._model.get_vocabulary(self._community)
+
+        table = MessageTable(sorted(self._community.channels['1'].messages.values(),
+                                    key=lambda message: message.timestamp), self._model._hyperparameters)
+        pairs = self._model._get_all_pairs(table)
+        self._context.classifier = RandomForestClassifier(n_estimators=10, random_state=0).fit(
+            self._model._extract_all_features(pairs, table, Feature.get_default_features(), self._context.vocabulary),
+            pairs.labels)
+
+    def _get_sequential_conversations(self, channels):
+        conversations = []
+
+        for channel in channels:
+            table = MessageTable(sorted(channel.messages.values(), key=lambda message: message.timestamp),
+                                 self._model._hyperparameters)
+            pairs = self._model._get_all_pairs(table)
+            feature_matrix = self._model._extract_all_features(pairs,
+                                                               table,
+                                                               Feature.get_default_features(),
+                                                               self._context.vocabulary)
+            self._model._predict_max_entropy(feature_matrix, pairs, self._context.classifier)
+            pred_conversations, _ = self._model._cluster_messages(pairs, len(table))
+
+            conversations.append({message.uuid: f'T{conversation}'
+                                  for message, conversation in zip(table.messages, pred_conversations)})
+
+        return conversations
+
+    def test_same_conversations_as_sequential_prediction(self):
+        channels = list(self._community.channels.values())
+        expected_conversations = self._get_sequential_conversations(channels)
+
+        self._model._predict_channels(self._context, channels, Feature.get_default_features(), 2)
+
+        self.assertEqual([{uuid: message.conversation for uuid, message in channel.messages.items()}
+                          for channel in channels], expected_conversations)
+
+    def test_same_conversations_with_time_shards(self):
+        channels = list(self._community.channels.values())
+        expected_conversations = self._get_sequential_conversations(channels)
+
+        self._model._constants['prediction shard size'] = '32'
+        self._model._predict_channels(self._context, channels, Feature.get_default_features(), 3)
+
+        self.assertEqual([{uuid: message.conversation for uuid, message in channel.messages.items()}
+                          for channel in channels], expected_conversations)
+
+    def test_parallel_prediction_shares_the_memo(self):
+        channels = list(self._community.channels.values())
+        expected_conversations = self._get_sequential_conversations(channels)
+        self._context.probability_memo = ProbabilityMemo()
+
+        self._model._predict_channels(self._context, channels, Feature.get_default_features(), 2)
+        memo_entries = self._context.probability_memo.get_entries()
+
+        self.assertGreater(len(memo_entries[0]), 0)
+
+        with mock.patch.object(self._context.probability_memo,
+                               'put',
+                               wraps=self._context.probability_memo.put) as put:
+            self._model._predict_channels(self._context, channels, Feature.get_default_features(), 2)
+
+        # The workers start from the memo of the model, so the second request finds all the feature vectors in it
+        self.assertTrue(put.called)
+        self.assertEqual([len(call.args[0]) for call in put.call_args_list], [0] * put.call_count)
+        self.assertEqual(sorted(self._context.probability_memo.get_entries()[0]), sorted(memo_entries[0]))
+        self.assertEqual([{uuid: message.conversation for uuid, message in channel.messages.items()}
+                          for channel in channels], expected_conversations)
+
+    def test_predictions_are_the_most_probable_labels(self):
+        table = MessageTable(sorted(self._community.channels['0'].messages.values(),
+                                    key=lambda message: message.timestamp), self._model._hyperparameters)
+        pairs = self._model._get_all_pairs(table)
+        feature_matrix = self._model._extract_all_features(pairs,
+                                                           table,
+                                                           Feature.get_default_features(),
+                                                           self._context.vocabulary)
+
+        (predictions, statistics), _ = self._model._predict_max_entropy(feature_matrix,
+                                                                        pairs,
+                                                                        self._context.classifier)
+
+        self.assertEqual(predictions.tolist(), self._context.classifier.predict(feature_matrix).tolist())
+        self.assertEqual(pairs.probabilities.tolist(),
+                         self._context.classifier.predict_proba(feature_matrix)[:, 1].astype(numpy.float32).tolist())
+        self.assertLess(statistics['unique_pairs_ratio'], 1)
+
+    def test_memoized_predictions(self):
+        table = MessageTable(sorted(self._community.channels['0'].messages.values(),
+                                    key=lambda message: message.timestamp), self._model._hyperparameters)
+        pairs = self._model._get_all_pairs(table)
+        feature_matrix = self._model._extract_all_features(pairs,
+                                                           table,
+                                                           Feature.get_default_features(),
+                                                           self._context.vocabulary)
+        probability_memo = ProbabilityMemo()
+
+        (predictions, statistics), _ = self._model._predict_max_entropy(feature_matrix,
+                                                                        pairs,
+                                                                        self._context.classifier,
+                                                                        probability_memo)
+        probabilities = pairs.probabilities.tolist()
+
+        self.assertEqual(statistics['memo_hit_rate'], 0)
+        self.assertEqual(len(probability_memo), probability_memo.misses)
+
+        (memoized_predictions, statistics), _ = self._model._predict_max_entropy(feature_matrix,
+                                                                                 pairs,
+                                                                                 self._context.classifier,
+                                                                                 probability_memo)
+
+        self.assertEqual(statistics['memo_hit_rate'], 1)
+        self.assertEqual(probability_memo.hit_rate, .5)
+        self.assertEqual(memoized_predictions.tolist(), predictions.tolist())
+        self.assertEqual(pairs.probabilities.tolist(), probabilities)
+
+    def test_memo_evicts_least_recently_used(self):
+        probability_memo = ProbabilityMemo(2)
+        probability_memo.put([b'a', b'b'], [0, 1], [.1, .9])
+        probability_memo.get([b'a'])
+        probability_memo.put([b'c'], [1], [.8])
+
+        self.assertEqual(probability_memo.get([b'a', b'b', b'c']), [(0, .1), None, (1, .8)])
+        self.assertEqual((probability_memo.hits, probability_memo.misses), (3, 1))
+
+    def test_memo_records_new_entries(self):
+        probability_memo = ProbabilityMemo(2, record_new_entries=True)
+        probability_memo.put([b'a'], [0], [.1])
+        probability_memo.pop_new_entries()
+        probability_memo.put([b'b', b'c'], [1, 1], [.9, .8])
+
+        self.assertEqual(probability_memo.pop_new_entries(), ([b'b', b'c'], [1, 1], [.9, .8]))
+        self.assertEqual(probability_memo.pop_new_entries(), ([], [], []))
+        self.assertEqual(probability_memo.get_entries(), ([b'b', b'c'], [1, 1], [.9, .8]))
+
+    def test_new_model_has_empty_memo(self):
+        context = Context(self._community, '0' * 16)
+        key = self._model._get_model_key(context.training_set_hash, Feature.get_default_features())
+
+        self._model._memoize(key, self._context.classifier)
+        self._model._use_trained_model(context, Feature.get_default_features())
+        context.probability_memo.put([b'a'], [1], [.9])
+
+        self._model._memoize(key, self._context.classifier)
+        self._model._use_trained_model(context, Feature.get_default_features())
+
+        self.assertEqual(len(context.probability_memo), 0)
+
+    def test_unique_rows(self):
+        feature_matrix = numpy.array([[1, 0, 1], [0, 0, 0], [1, 0, 1], [0, 1, 0], [0, 0, 0]], dtype=numpy.uint8)
+
+        keys, indices, inverse = Model._get_unique_rows(feature_matrix)
+
+        self.assertEqual(len(set(keys)), 3)
+        self.assertEqual(feature_matrix[indices][inverse].tolist(), feature_matrix.tolist())
+
+    def test_same_conversations_with_batches(self):
+        channels = list(self._community.channels.values())
+        expected_conversations = self._get_sequential_conversations(channels)
+
+        self._model._constants['prediction batch pairs'] = '5000'
+        self._model._predict_channels_in_batches(self._context, channels, Feature.get_default_features())
+
+        self.assertEqual([{uuid: message.conversation for uuid, message in channel.messages.items()}
+                          for channel in channels], expected_conversations)
+
+    def test_shards_own_each_pair_once(self):
+        timestamps = numpy.array(sorted(MessageTable.get_timestamp(message)
+                                        for message in self._community.channels['1'].messages.values()))
+        self._model._constants['prediction shard size'] = '32'
+
+        shards = self._model._get_shards(timestamps)
+        shard_pairs = [self._model._get_pair_indices(timestamps[start:stop], first - start)
+                       for start, first, stop in shards]
+        left, right = self._model._get_pair_indices(timestamps)
+
+        self.assertGreater(len(shards), 1)
+        self.assertEqual(numpy.concatenate([shard_left + start for (shard_left, _), (start, _, _)
+                                            in zip(shard_pairs, shards)]).tolist(), left.tolist())
+        self.assertEqual(numpy.concatenate([shard_right + start for (_, shard_right), (start, _, _)
+                                            in zip(shard_pairs, shards)]).tolist(), right.tolist())
@@ -1,7 +1,5 @@
 import tqdm
 
-from sklearn.metrics import precision_recall_fscore_support
-
 
 def micro_averaged_f_score_labels(statistics: dict, gold: [int], pred: [int], feature_group: str = None):
     """
@@ -104,6 +102,8 @@ def f_score(statistics: dict, labels: [int], prediction: [int], feature_group: s
     print(f'zeros ratio - labels: {len(list(filter(lambda numb: numb == 0, labels))) / len(labels)}')
     print(f'zeros ratio - pred: {len(list(filter(lambda numb: numb == 0, prediction))) / len(prediction)}')
 
+    from sklearn.metrics import precision_recall_fscore_support
+
     print(f'sklearn micro-averaged: {precision_recall_fscore_support(labels, prediction, average="micro")}')
     print(f'sklearn unspecified: {precision_recall_fscore_support(labels, prediction)}')
 
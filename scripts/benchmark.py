@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import numpy
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sklearn.metrics import f1_score
+
+from codi.api.model.input.community import Community
+from codi.api.model.disentanglement.model import Model
+from codi.api.model.disentanglement.forest import CompiledForest
+from codi.api.model.disentanglement.feature import Feature
+from codi.api.model.disentanglement.pair_set import PairSet
+from codi.api.model.disentanglement.vocabulary import Vocabulary
+from codi.api.model.disentanglement.disentangler import Disentangler
+from codi.api.model.disentanglement.message_table import MessageTable
+from codi.api.model.disentanglement.probability_memo import ProbabilityMemo
+from codi.api.utils.compute_statistics import micro_averaged_f_score_labels
+
+
+def load_community(path: str, platform: str, limit: int = None):
+    """
+    Load a community from a dataset, keeping at most `limit` messages per channel.
+
+    :param path: The path of the dataset, relative to the root of the repository
+    :param platform: The platform of the community
+    :param limit: The maximum number of messages per channel
+    :return: The community
+    """
+    with open(os.path.join(os.path.dirname(__file__), f'../{path}')) as f:
+        data = json.load(f)
+
+    data['platform'] = platform
+
+    if limit:
+        for channel in data['channels']:
+            channel['messages'] = channel['messages'][:limit]
+
+    return Community().deserialize(data)
+
+
+def load_long_channel(path: str, platform: str, messages_n: int):
+    """
+    Load the first channel of a dataset, repeated with later timestamps until it has `messages_n` messages.
+
+    :param path: The path of the dataset, relative to the root of the repository
+    :param platform: The platform of the community
+    :param messages_n: The number of messages of the channel
+    :return: The time sorted messages of the channel
+    """
+    with open(os.path.join(os.path.dirname(__file__), f'../{path}')) as f:
+        data = json.load(f)
+
+    data['platform'] = platform
+    messages = data['channels'][0]['messages']
+    duration = max(int(message['timestamp']) for message in messages) + 1
+    data['channels'] = [{**data['channels'][0],
+                         'messages': [{**message,
+                                       'id': f'{message["id"]}-{i // len(messages)}',
+                                       'timestamp': str(int(message['timestamp']) + i // len(messages) * duration)}
+                                      for i, message in ((i, messages[i % len(messages)]) for i in range(messages_n))]}]
+
+    channel = list(Community().deserialize(data).channels.values())[0]
+
+    return sorted(channel.messages.values(), key=lambda message: message.timestamp)
+
+
+def get_scored_channels(model: Model, classifier, community: Community):
+    """
+    Compute the pairs of each channel of a community and their probabilities with the trained model.
+
+    :param model: The model
+    :param classifier: The trained classifier
+    :param community: The community
+    :return: The list of the gold conversations, the PairSet, and the number of messages of each channel
+    """
+    channels = []
+    vocabulary = model.get_vocabulary(community)
+
+    for channel in community.channels.values():
+        if len(channel.messages) > 0:
+            messages = sorted(channel.messages.values(), key=lambda message: message.timestamp)
+            table = MessageTable(messages, model._hyperparameters)
+            pairs = model._get_all_pairs(table)
+            feature_matrix = model._extract_all_features(pairs, table, Feature.get_default_features(), vocabulary)
+
+            model._predict_max_entropy(feature_matrix, pairs, classifier)
+            channels.append((model._get_target_conversation_labels(channel), pairs, len(messages)))
+
+    return channels
+
+
+def get_feature_matrix(model: Model, community: Community):
+    """
+    Compute the pairs of all the channels of a community and their feature matrix.
+
+    :param model: The model
+    :param community: The community
+    :return: The concatenated PairSet and feature matrix of the channels
+    """
+    vocabulary = model.get_vocabulary(community)
+    channels_pairs, feature_matrices = [], []
+
+    for channel in community.channels.values():
+        if len(channel.messages) > 0:
+            messages = sorted(channel.messages.values(), key=lambda message: message.timestamp)
+            table = MessageTable(messages, model._hyperparameters)
+            pairs = model._get_all_pairs(table)
+
+            channels_pairs.append(pairs)
+            feature_matrices.append(model._extract_all_features(pairs,
+                                                                table,
+                                                                Feature.get_default_features(),
+                                                                vocabulary,
+                                                                training=False))
+
+    return PairSet.concatenate(channels_pairs)[0], numpy.vstack(feature_matrices)
+
+
+def benchmark_clustering(args):
+    """
+    Compare the clustering strategies on the same pair probabilities, by clustering time and micro-averaged F score.
+    """
+    model = Model()
+    classifier, _ = model.train(load_community(args.training_set, args.platform, args.limit))
+    channels = get_scored_channels(model, classifier, load_community(args.validation_set, args.platform, args.limit))
+    messages_n_total = sum(messages_n for _, _, messages_n in channels)
+
+    print(f'{"clustering":<12} {"links":>5} {"threshold":>9} {"time (s)":>9} {"F":>7} {"conversations":>13}')
+
+    union_find_settings = [(links, threshold) for links in ['BEST', 'ALL'] for threshold in args.thresholds]
+
+    for clustering in args.strategies:
+        for links, threshold in (union_find_settings if clustering == 'UNION_FIND' else [('', '')]):
+            model._hyperparameters['clustering'] = clustering
+            model._hyperparameters['union find threshold'] = str(threshold)
+            model._hyperparameters['union find best link'] = str(links == 'BEST')
+
+            clustering_time, f, conversations_n = 0.0, 0.0, 0
+
+            for gold, pairs, messages_n in channels:
+                start = time.perf_counter()
+                pred_conversations, _ = model._cluster_messages(pairs, messages_n)
+                clustering_time += time.perf_counter() - start
+
+                f += micro_averaged_f_score_labels({}, gold, pred_conversations) * messages_n / messages_n_total
+                conversations_n += len(set(pred_conversations))
+
+            print(f'{clustering:<12} {links:>5} {threshold:>9} {clustering_time:>9.3f} {f:>7.4f} {conversations_n:>13}')
+
+
+def benchmark_inference(args):
+    """
+    Compare the time to score the pairs of a dataset by calling the classifier for the predictions and for the
+    probabilities, by evaluating it once, by evaluating it once on the distinct feature vectors only, with the forest
+    compiled into NumPy arrays as well, and by looking them up in a memo of the predictions, as the model does. The
+    best time of several runs is reported, with the ratio of the rows that are classified.
+    """
+    model = Model()
+    classifier, _ = model.train(load_community(args.training_set, args.platform, args.limit))
+    pairs, feature_matrix = get_feature_matrix(model, load_community(args.validation_set, args.platform, args.limit))
+
+    def predict_and_predict_proba():
+        classifier.predict(feature_matrix)
+        classifier.predict_proba(feature_matrix)
+
+        return 1.0
+
+    def predict_proba():
+        classifier.predict_proba(feature_matrix)
+
+        return 1.0
+
+    def predict_max_entropy():
+        (_, statistics), _ = model._predict_max_entropy(feature_matrix, pairs, classifier)
+
+        return statistics['unique_pairs_ratio']
+
+    forest = CompiledForest.compile(classifier)
+
+    def predict_compiled_forest():
+        (_, statistics), _ = model._predict_max_entropy(feature_matrix, pairs, forest)
+
+        return statistics['unique_pairs_ratio']
+
+    probability_memo = ProbabilityMemo()
+
+    def predict_memoized_max_entropy():
+        (_, statistics), _ = model._predict_max_entropy(feature_matrix, pairs, classifier, probability_memo)
+
+        return statistics['unique_pairs_ratio'] * (1 - statistics['memo_hit_rate'])
+
+    # The memo is filled once, so that the runs measure the requests that find the feature vectors already memoized
+    model._predict_max_entropy(feature_matrix, pairs, classifier, probability_memo)
+
+    print(f'{"inference":<28} {"pairs":>8} {"rows":>6} {"time (s)":>9}')
+
+    for inference, run in [('predict + predict_proba', predict_and_predict_proba),
+                           ('predict_proba', predict_proba),
+                           ('unique rows predict_proba', predict_max_entropy),
+                           ('unique rows compiled forest', predict_compiled_forest),
+                           ('memoized predict_proba', predict_memoized_max_entropy)]:
+        times = []
+
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            rows_ratio = run()
+            times.append(time.perf_counter() - start)
+
+        print(f'{inference:<28} {len(pairs):>8} {rows_ratio:>6.1%} {min(times):>9.3f}')
+
+
+def benchmark_cascade(args):
+    """
+    Compare the uncertainty bands of the cascade classifier, by the ratio of the pairs escalated to the forest, the
+    scoring time, and the change of the F score of the pairs and of the micro-averaged F score of the conversations
+    with respect to the forest alone.
+    """
+    model = Model()
+    model._hyperparameters['classifier'] = 'CASCADE'
+    cascade, _ = model.train(load_community(args.training_set, args.platform, args.limit))
+    community = load_community(args.validation_set, args.platform, args.limit)
+    vocabulary = model.get_vocabulary(community)
+    channels = []
+
+    for channel in community.channels.values():
+        if len(channel.messages) > 0:
+            messages = sorted(channel.messages.values(), key=lambda message: message.timestamp)
+            table = MessageTable(messages, model._hyperparameters)
+            pairs = model._get_all_pairs(table)
+            feature_matrix = model._extract_all_features(pairs, table, Feature.get_default_features(), vocabulary)
+            channels.append((model._get_target_conversation_labels(channel), pairs, feature_matrix, len(messages)))
+
+    messages_n_total = sum(messages_n for _, _, _, messages_n in channels)
+    labels = numpy.concatenate([pairs.labels for _, pairs, _, _ in channels])
+    baseline = None
+
+    print(f'{"band":<11} {"escalated":>9} {"time (s)":>9} {"pairs F":>8} {"change":>7} {"F":>7} {"change":>7}')
+
+    # The whole band escalates every pair, i.e. it is the forest alone
+    for band in ['0:1'] + args.bands:
+        lower_bound, upper_bound = band.split(':')
+        model._hyperparameters['cascade lower bound'] = lower_bound
+        model._hyperparameters['cascade upper bound'] = upper_bound
+
+        scoring_time, escalated_n, classified_n, f, predictions = 0.0, 0.0, 0, 0.0, []
+
+        for gold, pairs, feature_matrix, messages_n in channels:
+            (channel_predictions, statistics), max_entropy_time = model._predict_max_entropy(feature_matrix,
+                                                                                             pairs,
+                                                                                             cascade)
+            pred_conversations, _ = model._cluster_messages(pairs, messages_n)
+
+            scoring_time += max_entropy_time
+            classified_n += round(statistics['unique_pairs_ratio'] * len(pairs))
+            escalated_n += statistics['escalated_ratio'] * round(statistics['unique_pairs_ratio'] * len(pairs))
+            f += micro_averaged_f_score_labels({}, gold, pred_conversations) * messages_n / messages_n_total
+            predictions.append(channel_predictions)
+
+        pairs_f = f1_score(labels, numpy.concatenate(predictions))
+        baseline = baseline or (pairs_f, f)
+
+        print(f'{band:<11} {escalated_n / classified_n:>9.1%} {scoring_time:>9.3f} {pairs_f:>8.4f} '
+              f'{pairs_f - baseline[0]:>+7.4f} {f:>7.4f} {f - baseline[1]:>+7.4f}')
+
+
+def benchmark_memory(args):
+    """
+    Compare the peak memory allocated to predict the conversations of channels of increasing length, on the whole
+    channel at once and streamed through a Disentangler, as traced by tracemalloc.
+    """
+    model = Model()
+    classifier, _ = model.train(load_community(args.training_set, args.platform, args.limit))
+
+    print(f'{"messages":>8} {"mode":<9} {"time (s)":>9} {"peak (MiB)":>10}')
+
+    for messages_n in args.messages:
+        messages = load_long_channel(args.validation_set, args.platform, messages_n)
+        vocabulary = Vocabulary()
+        vocabulary.add_messages(messages)
+
+        def predict_channel():
+            table = MessageTable(messages, model._hyperparameters)
+            pairs = model._get_all_pairs(table)
+            feature_matrix = model._extract_all_features(pairs, table, Feature.get_default_features(), vocabulary)
+            model._predict_max_entropy(feature_matrix, pairs, classifier)
+            model._cluster_messages(pairs, len(messages))
+
+        def stream_channel():
+            disentangler = Disentangler(model, classifier=classifier, vocabulary=vocabulary, max_pairs=args.max_pairs)
+
+            for _ in disentangler.disentangle(messages):
+                pass
+
+        for mode, run in [('channel', predict_channel), ('streaming', stream_channel)]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            run()
+            stop = time.perf_counter()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f'{messages_n:>8} {mode:<9} {stop - start:>9.3f} {peak / 2 ** 20:>10.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    clustering_parser = subparsers.add_parser('clustering', help='Compare the clustering strategies')
+    clustering_parser.add_argument('-t', '--training-set', default='datasets/json/from_previous_papers/training.json',
+                                   help='Dataset to use for training')
+    clustering_parser.add_argument('-v', '--validation-set', default='datasets/json/from_previous_papers/test.json',
+                                   help='Dataset to use for validation')
+    clustering_parser.add_argument('-p', '--platform', default='discord', help='The platform of the datasets')
+    clustering_parser.add_argument('-n', '--limit', type=int, help='The maximum number of messages per channel')
+    clustering_parser.add_argument('-s', '--strategies', nargs='+', default=['GREEDY', 'VECTORIZED', 'UNION_FIND'],
+                                   help='The clustering strategies to compare')
+    clustering_parser.add_argument('--thresholds', nargs='+', type=float, default=[.5, .9, .95, .99],
+                                   help='The thresholds of the union-find clustering')
+    clustering_parser.set_defaults(run=benchmark_clustering)
+
+    inference_parser = subparsers.add_parser('inference', help='Compare the inference strategies')
+    inference_parser.add_argument('-t', '--training-set', default='datasets/json/from_previous_papers/training.json',
+                                  help='Dataset to use for training')
+    inference_parser.add_argument('-v', '--validation-set', default='datasets/json/from_previous_papers/test.json',
+                                  help='Dataset whose pairs are scored')
+    inference_parser.add_argument('-p', '--platform', default='discord', help='The platform of the datasets')
+    inference_parser.add_argument('-n', '--limit', type=int, help='The maximum number of messages per channel')
+    inference_parser.add_argument('-r', '--runs', type=int, default=3, help='The number of runs of each strategy')
+    inference_parser.set_defaults(run=benchmark_inference)
+
+    cascade_parser = subparsers.add_parser('cascade', help='Compare the uncertainty bands of the cascade classifier')
+    cascade_parser.add_argument('-t', '--training-set', default='datasets/json/from_previous_papers/training.json',
+                                help='Dataset to use for training')
+    cascade_parser.add_argument('-v', '--validation-set', default='datasets/json/from_previous_papers/test.json',
+                                help='Dataset to use for validation')
+    cascade_parser.add_argument('-p', '--platform', default='discord', help='The platform of the datasets')
+    cascade_parser.add_argument('-n', '--limit', type=int, help='The maximum number of messages per channel')
+    cascade_parser.add_argument('-b', '--bands', nargs='+', default=['0.01:0.99', '0.05:0.95', '0.1:0.9', '0.2:0.8'],
+                                help='The uncertainty bands, as lower:upper screen probabilities')
+    cascade_parser.set_defaults(run=benchmark_cascade)
+
+    memory_parser = subparsers.add_parser('memory', help='Compare the peak memory of channel and streaming prediction')
+    memory_parser.add_argument('-t', '--training-set', default='datasets/json/from_previous_papers/training.json',
+                               help='Dataset to use for training')
+    memory_parser.add_argument('-v', '--validation-set', default='datasets/json/from_previous_papers/test.json',
+                               help='Dataset whose first channel is repeated to build the long channels')
+    memory_parser.add_argument('-p', '--platform', default='discord', help='The platform of the datasets')
+    memory_parser.add_argument('-n', '--limit', type=int, help='The maximum number of training messages per channel')
+    memory_parser.add_argument('-m', '--messages', nargs='+', type=int, default=[1000, 2000, 4000],
+                               help='The numbers of messages of the channels')
+    memory_parser.add_argument('--max-pairs', type=int, default=10000,
+                               help='The number of pairs scored at once when streaming')
+    memory_parser.set_defaults(run=benchmark_memory)
+
+    arguments = parser.parse_args()
+    arguments.run(arguments)